@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from app.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_RATE_PER_SEC,
+    LLM_BURST,
+    LLM_MAX_QUEUE,
+)
+from app.ratelimit import TokenBucket
+from app.resilience import LatencyTracker
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """התור מלא - המערכת בעומס חריג"""
+
+
+class AdmissionController:
+    """
+    בקרת כניסה לקריאות LLM
+
+    מגבילה את מספר הקריאות המקבילות ואת הקצב (דלי אסימונים),
+    ומחזיקה תור חסום שמשרת משתמשים בסבב (round-robin) כך שמשתמש
+    אחד עם הרבה בקשות לא מעכב את כל השאר.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.bucket = bucket or TokenBucket(LLM_RATE_PER_SEC, LLM_BURST)
+        self._active = 0
+        self._queued = 0
+        # תור לכל משתמש; סדר המפתחות הוא סדר הסבב
+        self._queues: "OrderedDict[Any, Deque[asyncio.Future]]" = OrderedDict()
+        self.wait_times = LatencyTracker()
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "peak_queue_depth": 0,
+        }
+
+    def _position(self, user_id: Any) -> int:
+        """מיקום משוער בתור לפי סדר הסבב (1 = הבא בתור)"""
+        own = len(self._queues[user_id])
+        return sum(min(len(q), own) for q in self._queues.values())
+
+    def _wake_next(self):
+        while self._active < self.max_concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if waiter.done():
+                continue
+            self._active += 1
+            waiter.set_result(None)
+
+    async def acquire(self, user_id: Any, on_queued: Optional[PositionCallback] = None):
+        """
+        קבלת אישור לקריאה
+
+        Raises:
+            QueueFullError: אם התור מלא
+        """
+        if self._active < self.max_concurrency and not self._queues:
+            self._active += 1
+        else:
+            if self._queued >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise QueueFullError("תור הניתוחים מלא")
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            self._queued += 1
+            self.counters["queued"] += 1
+            self.counters["peak_queue_depth"] = max(
+                self.counters["peak_queue_depth"], self._queued
+            )
+
+            started = time.monotonic()
+            if on_queued is not None:
+                try:
+                    await on_queued(self._position(user_id))
+                except Exception as e:
+                    print(f"שגיאה בעדכון מיקום בתור: {e}")
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # המקום כבר ניתן לנו - מעבירים אותו הלאה
+                    self.release()
+                raise
+            self.wait_times.observe(time.monotonic() - started)
+
+        try:
+            await self.bucket.acquire()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        self.counters["admitted"] += 1
+
+    def release(self):
+        self._active -= 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Any, on_queued: Optional[PositionCallback] = None):
+        await self.acquire(user_id, on_queued)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.counters)
+        stats["active"] = self._active
+        stats["max_concurrency"] = self.max_concurrency
+        stats["queue_depth"] = self._queued
+        stats["queued_users"] = len(self._queues)
+        stats["rate_limit_waits"] = self.bucket.waits
+        for name, q in (("p50", 0.5), ("p95", 0.95)):
+            value = self.wait_times.percentile(q)
+            stats[f"wait_{name}"] = round(value, 4) if value is not None else None
+        return stats
+
+
+# בקר משותף לכל קריאות הניתוח של הבוט
+ADMISSION = AdmissionController()
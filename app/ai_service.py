@@ -1,44 +1,37 @@
 import httpx
 import json
-import re
-from typing import Optional, Dict, Any
-from app.config import DEEPSEEK_API_KEY, DEEPSEEK_MODEL
-from app.prompts import SYSTEM_PROMPT_HE
-from app.schemas import Analysis
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable, get_args
+from app.config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_MODEL, DEEPSEEK_URL, DEEPSEEK_STREAM, DEEPSEEK_MAX_TOKENS,
+)
+from app.prompt_assembly import (
+    TOKEN_USAGE, OUTPUT_FORMATS, OUTPUT_MODE, build_messages, estimate_messages,
+)
+from app.schemas import Analysis, Category
+from app.http_client import get_client, track_request
+from app.cache import ANALYSIS_CACHE, make_key
+from app.coalesce import ANALYSIS_FLIGHTS
+from app.json_stream import IncrementalJSONScanner
+from app.json_extract import PARSE_STATS
+from app.resilience import UPSTREAM, CircuitOpenError
+from app.admission import ADMISSION, QueueFullError, PositionCallback
+from app.knowledge_base import get_kb
+from app.metrics import ANALYZE_LATENCY
 
-DEEPSEEK_URL = "https://api.deepseek.com/v1/chat/completions"
+# קולבק שנקרא עבור כל שדה JSON שהושלם בזמן ה-streaming
+FieldCallback = Callable[[str, str], Awaitable[None]]
 
+# תוצאות של _analyze_text שבהן הוחזר ניתוח חלופי
+FALLBACK_OUTCOMES = frozenset({"fallback", "http_error", "timeout", "parse_error"})
 
-def _extract_json(text: str) -> dict:
-    """
-    חילוץ נתוני JSON מתשובת המודל
-    """
-    # ניסיון 1: JSON ישיר
-    match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except json.JSONDecodeError:
-            pass
-    
-    # ניסיון 2: JSON בתוך code block
-    match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1))
-        except json.JSONDecodeError:
-            pass
-    
-    # ניסיון 3: ניקוי טקסט וניסיון חוזר
-    cleaned = re.sub(r'[\n\r\t]', ' ', text)
-    match = re.search(r'\{.*\}', cleaned)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except json.JSONDecodeError:
-            pass
-    
-    raise ValueError("לא ניתן לחלץ נתוני JSON תקינים מהתשובה")
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """טקסט ה-JSON מהודעה או מ-delta: תוכן רגיל או הארגומנטים של קריאה לכלי"""
+    tool_calls = message.get("tool_calls")
+    if tool_calls:
+        return tool_calls[0].get("function", {}).get("arguments") or ""
+    return message.get("content") or ""
 
 
 def _create_fallback_analysis(message: str) -> Analysis:
@@ -56,108 +49,96 @@ def _create_fallback_analysis(message: str) -> Analysis:
     )
 
 
-async def analyze_text(
-    user_text: str, 
+def _build_context(
+    user_text: str,
     collected_info: Optional[Dict[str, Any]] = None
-) -> Analysis:
-    """
-    ניתוח הטקסט שהוזן על ידי המשתמש באמצעות AI
-    
-    Args:
-        user_text: תיאור הבעיה המשפטית מהמשתמש
-        collected_info: מידע נוסף שנאסף משאלות המשך
-    
-    Returns:
-        Analysis: אובייקט המכיל את תוצאות הניתוח
-    """
-    
-    # במקרה שאין מפתח API
-    if not DEEPSEEK_API_KEY:
-        return Analysis(
-            category="אחר",
-            complexity="בינונית",
-            summary="הניתוח אינו זמין כרגע. אנא בדוק את הגדרות המערכת.",
-            missing_info=["תאריך מדויק של האירוע", "ערך הסכום או הנזק", "הצדדים המעורבים"],
-            confidence=0.0,
-        )
-
-    # בניית הטקסט המלא עם מידע נוסף אם קיים
-    full_context = user_text
+) -> List[Dict[str, str]]:
+    """בניית הודעות הבקשה עם מידע נוסף אם קיים"""
+    additional_context = ""
     
     if collected_info:
         additional_context = "\n\nמידע נוסף שנאסף:\n"
-        
-        # תרגום שמות השדות לעברית
-        field_translations = {
-            # שאלות קנייה אונליין
-            "purchase_date": "תאריך הרכישה",
-            "purchase_amount": "סכום הרכישה",
-            "has_invoice": "קיום חשבונית",
-            "contacted_seller": "פנייה למוכר",
-            "seller_response": "תגובת המוכר",
-            
-            # שאלות שכירות
-            "has_contract": "קיום חוזה כתוב",
-            "contract_duration": "משך החוזה",
-            "monthly_rent": "שכר דירה חודשי",
-            "deposit_amount": "סכום הפיקדון",
-            "handover_protocol": "פרוטוקול מסירה",
-            "written_complaint": "תלונה כתובה",
-            
-            # שאלות פרטיות
-            "incident_date": "תאריך האירוע",
-            "privacy_type": "סוג המידע שהופר",
-            "violation_platform": "פלטפורמת ההפרה",
-            "has_evidence": "קיום ראיות",
-            "requested_removal": "בקשת הסרה",
-            "ongoing_threat": "איום מתמשך",
-            
-            # שאלות חוזים
-            "has_written_contract": "חוזה כתוב",
-            "contract_date": "תאריך החוזה",
-            "contract_value": "ערך החוזה",
-            "breach_type": "סוג ההפרה",
-            "notified_other_party": "הודעה לצד השני",
-            "damages_occurred": "נגרמו נזקים",
-            
-            # שאלות נזקים כספיים
-            "damage_date": "תאריך הנזק",
-            "damage_amount": "שווי הנזק",
-            "damage_cause": "סיבת הנזק",
-            "responsible_party_known": "זיהוי הצד האחראי",
-            "compensation_requested": "דרישת פיצוי",
-            
-            # שאלות עבודה ותעסוקה
-            "has_employment_contract": "חוזה עבודה",
-            "employment_duration": "משך התעסוקה",
-            "monthly_salary": "שכר חודשי",
-            "issue_type": "סוג הבעיה",
-            "complaint_filed": "הגשת תלונה",
-            "has_payslips": "תלושי שכר",
-            
-            # שאלות כלליות
-            "financial_impact": "השפעה כספית",
-            "parties_involved": "הצדדים המעורבים",
-            "has_documentation": "קיום תיעוד",
-            "attempts_made": "צעדים שננקטו"
-        }
+        # תרגום שמות השדות לעברית (ממאגר הידע)
+        slot_labels = get_kb().slot_labels
         
         for key, value in collected_info.items():
-            field_name = field_translations.get(key, key)
+            field_name = slot_labels.get(key, key)
             additional_context += f"- {field_name}: {value}\n"
-        
-        full_context += additional_context
 
+    # קידומת מערכת קבועה ותיאור בעיה מקוצר לתקציב הטוקנים
+    return build_messages(user_text, additional_context)
+
+
+async def _stream_content(
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    on_field: FieldCallback,
+    on_usage: Callable[[Dict[str, Any]], None]
+) -> str:
+    """
+    קריאה למודל במצב streaming (SSE)
+
+    כל שדה שהושלם מועבר ל-on_field מיד, והטקסט המלא מוחזר בסוף.
+    """
+    scanner = IncrementalJSONScanner()
+    parts = []
+    stream_payload = {
+        **payload,
+        "stream": True,
+        # שדה usage מגיע בחלק האחרון (עם רשימת choices ריקה)
+        "stream_options": {"include_usage": True},
+    }
+
+    client = get_client()
+    async with track_request():
+        async with client.stream(
+            "POST",
+            DEEPSEEK_URL,
+            json=stream_payload,
+            headers=headers
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    on_usage(chunk["usage"])
+                if not chunk.get("choices"):
+                    continue
+                delta = _message_text(chunk["choices"][0].get("delta", {}))
+                if not delta:
+                    continue
+
+                parts.append(delta)
+                for key, value in scanner.feed(delta):
+                    await on_field(key, value)
+
+    return "".join(parts)
+
+
+async def _request_analysis(
+    messages: List[Dict[str, str]],
+    on_field: Optional[FieldCallback] = None,
+    endpoint: str = "analysis"
+) -> Analysis:
+    """
+    קריאה למודל ופענוח התשובה
+
+    זורקת חריגה בכל כשל - ההחלטה על ניתוח חלופי נעשית אצל הקורא.
+    """
     # הכנת בקשת API
     payload = {
         "model": DEEPSEEK_MODEL,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT_HE},
-            {"role": "user", "content": full_context},
-        ],
+        "messages": messages,
         "temperature": 0.15,
-        "max_tokens": 600,
+        "max_tokens": DEEPSEEK_MAX_TOKENS,
         "top_p": 0.9,
+        **OUTPUT_FORMATS[OUTPUT_MODE],
     }
     
     headers = {
@@ -165,8 +146,18 @@ async def analyze_text(
         "Content-Type": "application/json",
     }
 
-    try:
-        async with httpx.AsyncClient(timeout=40) as client:
+    streaming = DEEPSEEK_STREAM and on_field is not None
+    estimated_prompt = estimate_messages(messages)
+
+    def on_usage(usage: Dict[str, Any]):
+        TOKEN_USAGE.record(endpoint, usage, estimated_prompt)
+
+    async def attempt() -> str:
+        if streaming:
+            return await _stream_content(payload, headers, on_field, on_usage)
+
+        client = get_client()
+        async with track_request():
             response = await client.post(
                 DEEPSEEK_URL, 
                 json=payload, 
@@ -175,41 +166,220 @@ async def analyze_text(
             response.raise_for_status()
             data = response.json()
 
+        on_usage(data.get("usage"))
+
         # חילוץ התוכן
-        content = data["choices"][0]["message"]["content"]
-        parsed_data = _extract_json(content)
-        
-        # בדיקת שלמות הנתונים
-        if "category" not in parsed_data:
-            parsed_data["category"] = "אחר"
-        if "complexity" not in parsed_data:
-            parsed_data["complexity"] = "בינונית"
-        if "summary" not in parsed_data:
-            parsed_data["summary"] = "התיק התקבל ונמצא בבדיקה"
-        if "missing_info" not in parsed_data:
-            parsed_data["missing_info"] = []
-        if "confidence" not in parsed_data:
-            parsed_data["confidence"] = 0.5
-            
-        return Analysis(**parsed_data)
-        
+        return _message_text(data["choices"][0]["message"])
+
+    # ניסיונות חוזרים, תקציב זמן ומפסק; hedging רק כשאין streaming
+    content = await UPSTREAM[endpoint].call(attempt, hedge=not streaming)
+    # פענוח ישיר ל-Analysis; חילוץ ותיקון רק כשהפלט אינו JSON תקין
+    return PARSE_STATS.parse(content, OUTPUT_MODE)
+
+
+async def _analyze_and_store(
+    cache_key: str,
+    user_text: str,
+    collected_info: Optional[Dict[str, Any]] = None,
+    on_field: Optional[FieldCallback] = None,
+    endpoint: str = "analysis",
+    user_id: Any = None,
+    on_queued: Optional[PositionCallback] = None
+) -> Analysis:
+    """קריאה למודל ושמירת התוצאה במטמון (פעם אחת לכל קבוצת קריאות מאוחדות)"""
+    # רק מוביל הקבוצה תופס מקום בתור - פגיעות מטמון וממתינים לא נספרים
+    async with ADMISSION.slot(user_id, on_queued):
+        analysis = await _request_analysis(
+            _build_context(user_text, collected_info), on_field, endpoint
+        )
+
+    # רק ניתוח אמיתי נשמר - ניתוח חלופי לעולם לא נכנס למטמון
+    if ANALYSIS_CACHE is not None:
+        ANALYSIS_CACHE.set(cache_key, analysis)
+
+    return analysis
+
+
+async def _analyze_text(
+    user_text: str,
+    collected_info: Optional[Dict[str, Any]],
+    on_category: Optional[Callable[[str], Awaitable[None]]],
+    user_id: Any = None,
+    on_queued: Optional[PositionCallback] = None
+) -> Tuple[Analysis, str]:
+    """הניתוח עצמו; מחזיר גם את התוצאה (outcome) עבור המטריקות"""
+    # במקרה שאין מפתח API
+    if not DEEPSEEK_API_KEY:
+        return Analysis(
+            category="אחר",
+            complexity="בינונית",
+            summary="הניתוח אינו זמין כרגע. אנא בדוק את הגדרות המערכת.",
+            missing_info=["תאריך מדויק של האירוע", "ערך הסכום או הנזק", "הצדדים המעורבים"],
+            confidence=0.0,
+        ), "fallback"
+
+    # בדיקה במטמון - תיאורים זהים לא משלמים שוב על קריאה למודל
+    cache_key = make_key(user_text, collected_info)
+    if ANALYSIS_CACHE is not None:
+        cached = ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return cached, "cached"
+
+    on_field = None
+    if on_category is not None:
+        fired = []
+
+        async def on_field(key: str, value: str):
+            # ניסיון חוזר עלול להזרים את הקטגוריה שוב - הקולבק נקרא פעם אחת
+            if key != "category" or value not in get_args(Category) or fired:
+                return
+            fired.append(value)
+            try:
+                await on_category(value)
+            except Exception as e:
+                print(f"שגיאה בטיפול מוקדם בקטגוריה: {e}")
+
+    try:
+        # קריאות מקבילות עם אותו קלט ממתינות לקריאה אחת למודל
+        analysis = await ANALYSIS_FLIGHTS.do(
+            cache_key,
+            lambda: _analyze_and_store(
+                cache_key, user_text, collected_info, on_field,
+                user_id=user_id, on_queued=on_queued,
+            ),
+        )
+        return analysis, "success"
+
+    except QueueFullError:
+        # הבוט מציג הודעת עומס במקום ניתוח חלופי
+        raise
     except httpx.HTTPStatusError as e:
         print(f"שגיאת התחברות ל-API: {e.response.status_code}")
         return _create_fallback_analysis(
             "אירעה שגיאה בהתחברות לשירות הניתוח. נא לנסות שוב."
-        )
+        ), "http_error"
+    except CircuitOpenError:
+        print("המפסק פתוח - מדלג על הקריאה ל-API")
+        return _create_fallback_analysis(
+            "שירות הניתוח אינו זמין כרגע. נא לנסות שוב בעוד מספר דקות."
+        ), "fallback"
     except httpx.TimeoutException:
         print("תם הזמן להתחברות ל-API")
         return _create_fallback_analysis(
             "הניתוח לקח זמן רב מהצפוי. נא לנסות שוב."
-        )
+        ), "timeout"
     except ValueError as e:
         print(f"שגיאה בעיבוד הנתונים: {e}")
         return _create_fallback_analysis(
             "אירעה שגיאה בעיבוד התשובה. נא לנסח את הבעיה בצורה ברורה יותר."
-        )
+        ), "parse_error"
     except Exception as e:
         print(f"שגיאה בלתי צפויה: {type(e).__name__}: {e}")
         return _create_fallback_analysis(
             "אירעה שגיאה בלתי צפויה. נא ליצור קשר עם התמיכה הטכנית."
-        )
\ No newline at end of file
+        ), "fallback"
+
+
+async def analyze_text(
+    user_text: str, 
+    collected_info: Optional[Dict[str, Any]] = None,
+    on_category: Optional[Callable[[str], Awaitable[None]]] = None,
+    user_id: Any = None,
+    on_queued: Optional[PositionCallback] = None
+) -> Analysis:
+    """
+    ניתוח הטקסט שהוזן על ידי המשתמש באמצעות AI
+    
+    Args:
+        user_text: תיאור הבעיה המשפטית מהמשתמש
+        collected_info: מידע נוסף שנאסף משאלות המשך
+        on_category: קולבק שנקרא ברגע שהקטגוריה הגיעה ב-streaming
+            (לא נקרא כשהתשובה מגיעה מהמטמון או מקריאה מאוחדת)
+        user_id: המשתמש, לתור ההוגן של ADMISSION
+        on_queued: קולבק עם המיקום בתור כשהקריאה למודל ממתינה
+    
+    Returns:
+        Analysis: אובייקט המכיל את תוצאות הניתוח
+
+    Raises:
+        QueueFullError: התור של ADMISSION מלא
+    """
+    analysis, _ = await analyze_text_with_outcome(
+        user_text, collected_info, on_category, user_id, on_queued
+    )
+    return analysis
+
+
+async def analyze_text_with_outcome(
+    user_text: str,
+    collected_info: Optional[Dict[str, Any]] = None,
+    on_category: Optional[Callable[[str], Awaitable[None]]] = None,
+    user_id: Any = None,
+    on_queued: Optional[PositionCallback] = None
+) -> Tuple[Analysis, str]:
+    """
+    כמו analyze_text, יחד עם התוצאה (success / cached / אחת מ-FALLBACK_OUTCOMES)
+
+    הבוט צריך לדעת אם הוחזר ניתוח חלופי אחרי שהקטגוריה כבר הגיעה ב-streaming.
+    """
+    started = time.perf_counter()
+    analysis, outcome = await _analyze_text(
+        user_text, collected_info, on_category, user_id, on_queued
+    )
+    ANALYZE_LATENCY.observe(time.perf_counter() - started, outcome)
+    return analysis, outcome
+
+
+async def pending_analysis(user_text: str) -> Optional[Analysis]:
+    """
+    ניתוח המודל לטקסט אם כבר קיים במטמון או רץ כרגע, בלי קריאה חדשה
+
+    משמש את המסלול המהיר: הניתוח הזמני מוחלף בתוצאת המודל שרצה ברקע.
+    """
+    cache_key = make_key(user_text)
+    if ANALYSIS_CACHE is not None:
+        cached = ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+    try:
+        return await ANALYSIS_FLIGHTS.wait(cache_key)
+    except Exception as e:
+        print(f"הניתוח ברקע נכשל: {type(e).__name__}: {e}")
+        return None
+
+
+async def refine_analysis(
+    user_text: str,
+    collected_info: Dict[str, Any],
+    user_id: Any = None
+) -> Optional[Analysis]:
+    """
+    ניתוח מחודש של הבעיה יחד עם התשובות לשאלות ההמשך
+
+    בניגוד ל-analyze_text אין ניתוח חלופי: בכשל מוחזר None
+    והבוט ממשיך עם הניתוח הראשוני.
+    """
+    if not DEEPSEEK_API_KEY:
+        return None
+
+    cache_key = make_key(user_text, collected_info)
+    if ANALYSIS_CACHE is not None:
+        cached = ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        return await ANALYSIS_FLIGHTS.do(
+            cache_key,
+            lambda: _analyze_and_store(
+                cache_key, user_text, collected_info,
+                endpoint="refine", user_id=user_id,
+            ),
+        )
+    except QueueFullError:
+        print("התור מלא - מדלג על ניתוח מחודש")
+    except CircuitOpenError:
+        print("המפסק פתוח - מדלג על ניתוח מחודש")
+    except Exception as e:
+        print(f"שגיאה בניתוח מחודש: {type(e).__name__}: {e}")
+    return None
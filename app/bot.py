@@ -1,14 +1,29 @@
+import asyncio
+import time
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
-from datetime import datetime, timedelta
 from typing import Optional
 
-from app.ai_service import analyze_text
+from app.ai_service import analyze_text, analyze_text_with_outcome, pending_analysis, FALLBACK_OUTCOMES
+from app.classifier import classify
+from app.config import BOT_MODE, TELEGRAM_BASE_URL, REFINE_ENABLED, FAST_PATH_MODE
 from app.rules import format_reply, get_legal_resources
-from app.state import SESSIONS
-from app.session import Session
-from app.followups import get_followups
+from app.state import SESSION_STORE, SESSION_EXPIRY
+from app.session import Phase, Session
+from app.followups import get_flow
 from app.validators import validate
+from app.admission import QueueFullError
+from app.dispatcher import UserOrderedUpdateProcessor
+from app.refine import REFINER
+from app.outbound import OUTBOX
+from app.metrics import HANDLE_LATENCY
+
+# ניתוחי רקע של המסלול המהיר (הפניה חזקה עד לסיום)
+_background_tasks: set = set()
+
+# סשן שפג - גם דלי השליחה של הצ'אט (בצ'אט פרטי מזהה הצ'אט הוא מזהה המשתמש).
+# תיבות הדואר של ה-dispatcher ותורי ה-admission נמחקים ממילא כשהם מתרוקנים
+SESSION_EXPIRY.on_expire(OUTBOX.forget)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -33,7 +48,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 הערה: זהו ייעוץ ראשוני בלבד, לא תחליף לעורך דין.
 
 להתחלת תיק חדש: /new"""
-    await update.message.reply_text(welcome_message)
+    # פקודה שלא משנה את הסשן - רק מאריכה את תוקפו, בלי לשמור אותו מחדש
+    await SESSION_STORE.touch(update.effective_user.id)
+    await OUTBOX.reply(update.message, welcome_message)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -57,7 +74,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /end - סיום תיק
 /resources - משאבים משפטיים
 /help - הודעה זו"""
-    await update.message.reply_text(help_text)
+    await SESSION_STORE.touch(update.effective_user.id)
+    await OUTBOX.reply(update.message, help_text)
 
 
 async def new_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -65,7 +83,6 @@ async def new_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     session = Session()
-    SESSIONS[user_id] = session
 
     session.active = True
     session.awaiting_problem = True
@@ -74,7 +91,8 @@ async def new_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session.pending_slot = None
     session.pending_kind = None
     session.pending_question = None
-    session.last_activity = datetime.now()
+    session.update_activity()
+    await SESSION_STORE.put(user_id, session)
 
     message = """התחלת תיק משפטי חדש
 
@@ -84,16 +102,17 @@ async def new_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
 "קניתי טלפון באתר באינטרנט ב-2000 ₪, המוצר הגיע פגום ולא עובד, והחברה מסרבת להחזיר את הכסף או להחליף."
 
 שתי-שלוש משפטים מספיקות."""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def end_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """סיום תיק"""
     user_id = update.effective_user.id
-    session = SESSIONS.get(user_id)
+    session = await SESSION_STORE.get(user_id)
 
     if not session or not session.active:
-        await update.message.reply_text(
+        await OUTBOX.reply(
+            update.message,
             "אין תיק פתוח כרגע.\n\n"
             "להתחלת תיק חדש: /new"
         )
@@ -109,9 +128,10 @@ async def end_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply += "\n\n✓ התיק הסתיים בהצלחה"
         reply += "\n\nלתיק חדש: /new"
         
-        await update.message.reply_text(reply)
+        await OUTBOX.reply(update.message, reply)
     else:
-        await update.message.reply_text(
+        await OUTBOX.reply(
+            update.message,
             "התיק הסתיים ללא ניתוח.\n\n"
             "לתיק חדש: /new"
         )
@@ -121,6 +141,7 @@ async def end_case(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session.pending_slot = None
     session.pending_kind = None
     session.pending_question = None
+    await SESSION_STORE.put(user_id, session)
 
 
 async def show_resources(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -138,7 +159,8 @@ async def show_resources(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /resources_general - כללי
 
 חזרה לתפריט: /start"""
-    await update.message.reply_text(resources_menu)
+    await SESSION_STORE.touch(update.effective_user.id)
+    await OUTBOX.reply(update.message, resources_menu)
 
 
 async def resources_shopping(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -149,7 +171,7 @@ async def resources_shopping(update: Update, context: ContextTypes.DEFAULT_TYPE)
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_rent(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -160,7 +182,7 @@ async def resources_rent(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_privacy(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -171,7 +193,7 @@ async def resources_privacy(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_contracts(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -182,7 +204,7 @@ async def resources_contracts(update: Update, context: ContextTypes.DEFAULT_TYPE
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_damage(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -193,7 +215,7 @@ async def resources_damage(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_work(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -204,7 +226,7 @@ async def resources_work(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def resources_general(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -215,7 +237,7 @@ async def resources_general(update: Update, context: ContextTypes.DEFAULT_TYPE):
 {resources}
 
 חזרה: /resources"""
-    await update.message.reply_text(message)
+    await OUTBOX.reply(update.message, message)
 
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -223,15 +245,40 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = update.message.text.strip()
 
-    session = SESSIONS.get(user_id)
+    session = await SESSION_STORE.get(user_id)
     if session is None:
         session = Session()
-        SESSIONS[user_id] = session
 
-    session.last_activity = datetime.now()
+    session.update_activity()
+    started = time.perf_counter()
+    if not session.active:
+        phase = "inactive"
+    elif session.awaiting_problem:
+        phase = "problem"
+    elif session.phase == Phase.DONE:
+        # הודעה אחרי התשובה הסופית - לא נספרת שוב כ-final
+        phase = "after_final"
+    else:
+        phase = "answer"
+
+    try:
+        await _process_text(update, session, text)
+    finally:
+        # שמירת הסשן אחרי כל שינוי (באחסון חיצוני זה הכתיבה היחידה)
+        await SESSION_STORE.put(user_id, session)
+        # "final" רק בהודעה שבה התיק עבר ל-DONE
+        if phase != "after_final" and session.phase == Phase.DONE:
+            phase = "final"
+        HANDLE_LATENCY.observe(time.perf_counter() - started, phase)
+
+
+async def _process_text(update: Update, session: Session, text: str):
+    """לוגיקת השיחה עבור הודעת טקסט, מעל סשן שכבר נטען"""
+    user_id = update.effective_user.id
 
     if not session.active:
-        await update.message.reply_text(
+        await OUTBOX.reply(
+            update.message,
             "אין תיק פתוח.\n\n"
             "להתחלת תיק חדש: /new"
         )
@@ -240,44 +287,97 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # שלב 1: קבלת תיאור הבעיה
     if session.awaiting_problem:
         if len(text) < 20:
-            await update.message.reply_text(
+            await OUTBOX.reply(
+                update.message,
                 "התיאור קצר מדי. אנא תאר את הבעיה ביתר פירוט.\n\n"
                 "דוגמה: קניתי מוצר באתר והגיע פגום, והחברה מסרבת להחזיר כסף."
             )
             return
 
-        processing_message = await update.message.reply_text(
+        # מסלול מהיר: סיווג מקומי ברור מתחיל את השאלון בלי להמתין למודל
+        provisional = classify(text) if FAST_PATH_MODE in ("background", "skip") else None
+        if provisional is not None:
+            session.analysis = provisional
+            session.awaiting_problem = False
+            session.problem_text = text
+            if FAST_PATH_MODE == "background":
+                # המודל רץ ברקע; התוצאה מחליפה את הניתוח הזמני בסוף השאלון
+                session.provisional = True
+                task = asyncio.create_task(_analyze_in_background(user_id, text))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            await _start_followups(update, session)
+            return
+
+        processing_message = await OUTBOX.reply(
+            update.message,
             "מנתח את הבעיה...\nרגע אחד."
         )
 
-        try:
-            session.analysis = await analyze_text(text)
+        # שאלה ראשונה שנשלחה כבר בזמן ה-streaming (אם נשלחה)
+        early = {"category": None}
+
+        async def on_category(category: str):
+            first = get_flow(category).step(0)
+            if first is None:
+                return
+            session.ask(first, 0)
             session.awaiting_problem = False
+            early["category"] = category
 
             await processing_message.delete()
+            await OUTBOX.reply(
+                update.message,
+                "הבעיה נותחה בהצלחה.\n\n"
+                "כמה שאלות נוספות לדיוק הניתוח:\n\n"
+                f"{session.pending_question}"
+            )
 
-            followups = get_followups(session.analysis)
-            
-            if followups and len(followups) > 0:
-                first = followups[0]
-                session.pending_slot = first["slot"]
-                session.pending_kind = first["kind"]
-                session.pending_question = first["q"]
-                
-                intro_message = (
-                    "הבעיה נותחה בהצלחה.\n\n"
-                    "כמה שאלות נוספות לדיוק הניתוח:\n\n"
-                    f"{session.pending_question}"
-                )
-                await update.message.reply_text(intro_message)
+        async def on_queued(position: int):
+            await OUTBOX.edit(
+                processing_message,
+                "יש עומס על המערכת כרגע.\n"
+                f"מקומך בתור: {position}\n"
+                "הניתוח יתחיל אוטומטית, אין צורך לשלוח שוב."
+            )
+
+        try:
+            # בקרת הכניסה (ADMISSION) חלה רק על קריאה אמיתית למודל
+            analysis, outcome = await analyze_text_with_outcome(
+                text, on_category=on_category, user_id=user_id, on_queued=on_queued
+            )
+            session.analysis = analysis
+            session.awaiting_problem = False
+            if REFINE_ENABLED:
+                session.problem_text = text
+
+            if early["category"] is not None:
+                if outcome in FALLBACK_OUTCOMES:
+                    # ה-stream נכשל אחרי שהשאלה הראשונה כבר נשלחה - ממשיכים בשאלון
+                    # של הקטגוריה שהגיעה (ולא עוברים בשקט לשאלון של "אחר")
+                    session.analysis = analysis.model_copy(update={"category": early["category"]})
+                    return
+                if early["category"] == session.analysis.category:
+                    return
+                # הניתוח הסופי שונה מהקטגוריה שהגיעה מוקדם - מתחילים מחדש
+                session.clear_pending()
             else:
-                reply = format_reply(session.analysis, include_resources=True)
-                reply += "\n\nלסיום התיק: /end"
-                await update.message.reply_text(reply)
+                await processing_message.delete()
+
+            await _start_followups(update, session)
                 
-        except Exception as e:
+        except QueueFullError:
             await processing_message.delete()
-            await update.message.reply_text(
+            await OUTBOX.reply(
+                update.message,
+                "המערכת בעומס חריג כרגע.\n\n"
+                "נסה לשלוח את תיאור הבעיה שוב בעוד מספר דקות."
+            )
+        except Exception as e:
+            if early["category"] is None:
+                await processing_message.delete()
+            await OUTBOX.reply(
+                update.message,
                 "אירעה שגיאה בניתוח.\n\n"
                 "נסה שוב, או התחל תיק חדש: /new"
             )
@@ -285,40 +385,59 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # שלב 2: תשובות לשאלות
+    flow = get_flow(session.analysis.category)
+
     if session.pending_slot:
         is_valid, validated_value = validate(session.pending_kind, text)
         
         if not is_valid:
-            await update.message.reply_text(
+            await OUTBOX.reply(
+                update.message,
                 "התשובה לא תקינה.\n\n"
                 "נסה שוב:\n\n"
                 f"{session.pending_question}"
             )
             return
 
-        session.slots[session.pending_slot] = validated_value
-        session.pending_slot = None
-        session.pending_kind = None
-        session.pending_question = None
+        # המיקום לפי שם השדה ולא לפי cursor - המאגר אולי נטען מחדש מאז
+        # שהשאלה נשאלה (או שהסשן שוחזר מ-snapshot / הועבר בין workers)
+        position = flow.index.get(session.pending_slot)
+        session.set_slot(session.pending_slot, validated_value)
+        session.clear_pending()
+        if position is not None:
+            # מעבר במכונת המצבים (כולל דילוג על שאלות לפי התשובה)
+            session.cursor = flow.advance(position, validated_value)
+        else:
+            session.cursor = flow.resume(session.has_slot)
 
     # שלב 3: שאלה הבאה או תוצאות
-    followups = get_followups(session.analysis)
+    step = flow.step(session.cursor)
     
-    for item in followups:
-        if item["slot"] not in session.slots:
-            session.pending_slot = item["slot"]
-            session.pending_kind = item["kind"]
-            session.pending_question = item["q"]
-            
-            remaining = len([f for f in followups if f["slot"] not in session.slots])
-            progress_message = (
-                f"{session.pending_question}\n\n"
-                f"שאלות נותרו: {remaining}"
-            )
-            await update.message.reply_text(progress_message)
-            return
+    if step is not None:
+        session.ask(step, session.cursor)
+        progress_message = (
+            f"{session.pending_question}\n\n"
+            f"שאלות נותרו: {flow.remaining[session.cursor]}"
+        )
+        await OUTBOX.reply(update.message, progress_message)
+        return
 
-    # כל השאלות נענו - תוצאות סופיות
+    # כל השאלות נענו - ניתוח המודל מהרקע מחליף את הסיווג הזמני
+    if session.provisional:
+        session.provisional = False
+        analysis = await pending_analysis(session.problem_text)
+        # השאלון כבר נענה לפי הקטגוריה הזמנית - מחליפים רק אם המודל מסכים
+        if analysis is not None and analysis.category == session.analysis.category:
+            session.analysis = analysis
+
+    # ניתוח מחודש עם התשובות (פעם אחת לתיק)
+    if REFINE_ENABLED and session.problem_text and session.slots and not session.refined:
+        session.refined = True
+        refined = await REFINER.refine(user_id, session.problem_text, session.slots)
+        if refined is not None:
+            session.analysis = refined
+
+    # תוצאות סופיות
     reply = format_reply(session.analysis, include_resources=True)
     
     if session.slots:
@@ -327,29 +446,58 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply += "\n\nלסיום התיק: /end"
     
-    await update.message.reply_text(reply)
+    session.phase = Phase.DONE
+    await OUTBOX.reply(update.message, reply)
 
 
-async def cleanup_old_sessions():
-    """ניקוי סשנים ישנים"""
-    current_time = datetime.now()
-    timeout = timedelta(hours=2)
-    
-    inactive_users = []
-    for user_id, session in SESSIONS.items():
-        if current_time - session.last_activity > timeout:
-            inactive_users.append(user_id)
+async def _start_followups(update: Update, session: Session):
+    """שאלת ההמשך הראשונה, או תשובה מלאה כשלקטגוריה אין שאלות"""
+    first = get_flow(session.analysis.category).step(0)
     
-    for user_id in inactive_users:
-        del SESSIONS[user_id]
-    
-    if inactive_users:
-        print(f"נוקו {len(inactive_users)} סשנים לא פעילים")
+    if first is not None:
+        session.ask(first, 0)
+        
+        intro_message = (
+            "הבעיה נותחה בהצלחה.\n\n"
+            "כמה שאלות נוספות לדיוק הניתוח:\n\n"
+            f"{session.pending_question}"
+        )
+        await OUTBOX.reply(update.message, intro_message)
+    else:
+        reply = format_reply(session.analysis, include_resources=True)
+        reply += "\n\nלסיום התיק: /end"
+        session.phase = Phase.DONE
+        await OUTBOX.reply(update.message, reply)
+
+
+async def _analyze_in_background(user_id: int, text: str):
+    """ניתוח המודל עבור המסלול המהיר - התוצאה נשמרת במטמון"""
+    try:
+        await analyze_text(text, user_id=user_id)
+    except QueueFullError:
+        print("התור מלא - הניתוח ברקע בוטל, נשאר הסיווג המקומי")
+    except Exception as e:
+        print(f"שגיאה בניתוח ברקע: {e}")
+
+
+async def cleanup_old_sessions():
+    """ניקוי סשנים ישנים (סבב תפוגה אחד)"""
+    await SESSION_EXPIRY.tick()
 
 
 def build_bot_app(token: str) -> Application:
     """בניית אפליקציית הבוט"""
-    app = Application.builder().token(token).build()
+    builder = (
+        Application.builder()
+        .token(token)
+        .base_url(TELEGRAM_BASE_URL)
+        # משתמשים שונים במקביל, כל משתמש לפי הסדר (הסשן שלו לא נגיש במקביל)
+        .concurrent_updates(UserOrderedUpdateProcessor())
+    )
+    if BOT_MODE == "webhook":
+        # העדכונים מגיעים מנקודת ה-webhook של FastAPI - אין צורך ב-Updater
+        builder = builder.updater(None)
+    app = builder.build()
     
     # פקודות בסיסיות
     app.add_handler(CommandHandler("start", start))
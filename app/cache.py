@@ -0,0 +1,220 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+from app.config import (
+    CACHE_BACKEND,
+    CACHE_TTL,
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_SQLITE_PATH,
+    DEEPSEEK_MODEL,
+)
+from app.prompts import SYSTEM_PROMPT_HE
+from app.schemas import Analysis
+
+_WHITESPACE = re.compile(r"\s+")
+
+# טביעת אצבע של הפרומפט - שינוי בפרומפט מבטל את כל הרשומות הישנות
+PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT_HE.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_text(text: str) -> str:
+    """נרמול טקסט לצורך השוואה: רווחים מאוחדים ואותיות קטנות"""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def make_key(
+    user_text: str,
+    collected_info: Optional[Dict[str, Any]] = None,
+    model: str = DEEPSEEK_MODEL,
+    prompt_hash: str = PROMPT_HASH,
+) -> str:
+    """מפתח מבוסס תוכן: טקסט מנורמל + מידע שנאסף + מודל + פרומפט"""
+    info = {
+        k: normalize_text(str(v)) for k, v in sorted((collected_info or {}).items())
+    }
+    material = json.dumps(
+        [normalize_text(user_text), info, model, prompt_hash],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """
+    אחסון בזיכרון עם פינוי LRU לפי מספר רשומות וגודל בבתים
+    """
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str, now: float) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= now:
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, expires_at: float):
+        self.delete(key)
+        self._data[key] = (value, expires_at)
+        self._bytes += len(value)
+        while self._data and (
+            self._bytes > self.max_bytes or len(self._data) > self.max_entries
+        ):
+            _, (old, _) = self._data.popitem(last=False)
+            self._bytes -= len(old)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[0])
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def size(self) -> Tuple[int, int]:
+        """(מספר רשומות, בתים)"""
+        return len(self._data), self._bytes
+
+
+class SQLiteBackend:
+    """
+    אחסון על דיסק ב-SQLite עם אותה מדיניות פינוי (LRU + TTL + גודל)
+    """
+    def __init__(
+        self,
+        path: str = CACHE_SQLITE_PATH,
+        max_bytes: int = CACHE_MAX_BYTES,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS analysis_cache_lru ON analysis_cache (last_access)"
+        )
+
+    def get(self, key: str, now: float) -> Optional[bytes]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            self.delete(key)
+            return None
+        self._conn.execute(
+            "UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key)
+        )
+        return row[0]
+
+    def set(self, key: str, value: bytes, expires_at: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires_at, time.time()),
+        )
+        count, total = self.size()
+        while count and (total > self.max_bytes or count > self.max_entries):
+            row = self._conn.execute(
+                "SELECT key, size FROM analysis_cache ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            self.delete(row[0])
+            count, total = count - 1, total - row[1]
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn.execute("DELETE FROM analysis_cache")
+
+    def size(self) -> Tuple[int, int]:
+        row = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache"
+        ).fetchone()
+        return row[0], row[1]
+
+
+class AnalysisCache:
+    """
+    מטמון ניתוחים מעל backend נבחר, עם מוני פגיעות/החטאות
+    """
+    def __init__(self, backend, ttl: float = CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key: str) -> Optional[Analysis]:
+        raw = self.backend.get(key, time.time())
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Analysis.model_validate_json(raw)
+
+    def set(self, key: str, analysis: Analysis):
+        self.stores += 1
+        self.backend.set(
+            key, analysis.model_dump_json().encode("utf-8"), time.time() + self.ttl
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self.backend.size()
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.backend.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.backend.max_bytes,
+        }
+
+
+def build_cache(backend: str = CACHE_BACKEND) -> Optional[AnalysisCache]:
+    """יצירת המטמון לפי ההגדרות (None = כבוי)"""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return AnalysisCache(SQLiteBackend())
+    return AnalysisCache(MemoryBackend())
+
+
+ANALYSIS_CACHE: Optional[AnalysisCache] = build_cache()
+
+
+def cache_stats() -> Dict[str, Any]:
+    """סטטיסטיקת המטמון לנקודת /stats"""
+    if ANALYSIS_CACHE is None:
+        return {"backend": "off"}
+    return ANALYSIS_CACHE.stats()
@@ -0,0 +1,52 @@
+from typing import Dict, Optional, Tuple
+
+from app.config import CLASSIFIER_THRESHOLD
+from app.knowledge_base import get_kb
+from app.schemas import Analysis
+
+# משקל "ללא ראיה": מונע ביטחון גבוה ממילת מפתח בודדת
+_PRIOR = 2.0
+
+PROVISIONAL_SUMMARY = "סיווג ראשוני לפי מילות המפתח בתיאור הבעיה."
+
+
+def score(text: str) -> Dict[str, float]:
+    """סכום משקלי מילות המפתח שנמצאו בטקסט, לפי קטגוריה"""
+    kb = get_kb()
+    scores: Dict[str, float] = {}
+    if kb.keyword_pattern is None:
+        return scores
+    for term in kb.keyword_pattern.findall(text.lower()):
+        for category, weight in kb.keywords[term]:
+            scores[category] = scores.get(category, 0.0) + weight
+    return scores
+
+
+def predict(text: str) -> Tuple[str, float]:
+    """
+    הקטגוריה הסבירה ביותר והביטחון בה
+
+    הביטחון הוא חלק הקטגוריה המובילה מכלל הראיות (כולל משקל "ללא ראיה"),
+    כך שגם שתי קטגוריות קרובות וגם מעט מילות מפתח מורידים אותו.
+    """
+    scores = score(text)
+    if not scores:
+        return "אחר", 0.0
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    top_category, top = ranked[0]
+    second = ranked[1][1] if len(ranked) > 1 else 0.0
+    return top_category, round(top / (top + second + _PRIOR), 3)
+
+
+def classify(text: str, threshold: float = CLASSIFIER_THRESHOLD) -> Optional[Analysis]:
+    """ניתוח זמני כשהסיווג המקומי בטוח מספיק, אחרת None"""
+    category, confidence = predict(text)
+    if category == "אחר" or confidence < threshold:
+        return None
+    return Analysis(
+        category=category,
+        complexity="בינונית",
+        summary=PROVISIONAL_SUMMARY,
+        missing_info=[],
+        confidence=confidence,
+    )
@@ -0,0 +1,458 @@
+"""
+מצב cluster: תהליך קדמי ו-N תהליכי worker
+
+התהליך הקדמי מקבל עדכונים מטלגרם (webhook או polling) ומנתב כל עדכון
+לפי מזהה המשתמש, ב-consistent hashing, ל-worker קבוע. כל worker הוא
+app.main:api רגיל עם SESSIONS משלו, מטמון משלו ומאגר חיבורים משלו
+ל-DeepSeek - כך שאין צורך באחסון סשנים חיצוני.
+
+כש-worker נופל הוא יוצא מהטבעת (המשתמשים שלו עוברים לשכנים ומתחילים
+מחדש) ומופעל מחדש; כשהוא חוזר, הסשנים של המשתמשים שחוזרים אליו מועברים
+אליו מה-workers שהחזיקו אותם בינתיים.
+
+הרצה:
+    python -m app.cluster
+"""
+import asyncio
+import os
+import secrets
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+from app.config import (
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_BASE_URL,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    LLM_RATE_PER_SEC,
+    SEND_GLOBAL_RATE,
+    CLUSTER_WORKERS,
+    CLUSTER_HOST,
+    CLUSTER_PORT,
+    CLUSTER_BASE_PORT,
+    CLUSTER_BATCH,
+    CLUSTER_HANDOFF_TIMEOUT,
+    SHUTDOWN_DRAIN_TIMEOUT,
+)
+from app.hash_ring import HashRing, SECRET_HEADER
+
+# worker שנפל מהר יותר מזה אחרי שעלה - ההמתנה לפני ההפעלה הבאה מוכפלת
+_STABLE_UPTIME = 10.0
+_MAX_RESTART_DELAY = 30.0
+
+
+def update_user_key(data: Dict[str, Any]) -> int:
+    """
+    מזהה המשתמש (או הצ'אט) של עדכון גולמי מטלגרם
+
+    המקבילה של effective_user בלי לבנות אובייקט Update בתהליך הקדמי.
+    עדכון בלי משתמש (למשל poll) מנותב למפתח 0.
+    """
+    for field, value in data.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        for name in ("from", "user", "chat"):
+            inner = value.get(name)
+            if isinstance(inner, dict) and "id" in inner:
+                return inner["id"]
+    return 0
+
+
+class Worker:
+    """תהליך worker אחד והעדכונים שממתינים להעברה אליו"""
+    def __init__(self, index: int, port: int):
+        self.name = f"w{index}"
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.ready = asyncio.Event()
+        # מוחזק בזמן שליחת אצווה - איזון מחדש ממתין לו
+        self.lock = asyncio.Lock()
+        self.started_at = 0.0
+        self.restarts = 0
+        self.forwarded = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": self.process.pid if self.process else None,
+            "port": self.port,
+            "pending": len(self.pending),
+            "forwarded": self.forwarded,
+            "restarts": self.restarts,
+        }
+
+
+class ClusterFront:
+    """
+    התהליך הקדמי: הפעלת ה-workers, ניתוב עדכונים ואיזון מחדש
+
+    העדכונים של כל worker נשלחים באצוות לפי סדר ההגעה, כך שהסדר של כל
+    משתמש נשמר. בזמן איזון מחדש השליחה נעצרת, הסשנים מועברים, והעדכונים
+    שממתינים מנותבים מחדש לפי הטבעת החדשה.
+    """
+    def __init__(
+        self,
+        workers: int = CLUSTER_WORKERS,
+        base_port: int = CLUSTER_BASE_PORT,
+        batch: int = CLUSTER_BATCH,
+    ):
+        self.workers = {w.name: w for w in (Worker(i, base_port + i) for i in range(max(1, workers)))}
+        self.batch = batch
+        self.secret = secrets.token_urlsafe(24)
+        self.ring = HashRing()
+        self._open = asyncio.Event()
+        self._rebalance_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._client: Optional[httpx.AsyncClient] = None
+        self.dispatched = 0
+        self.rebalances = 0
+        self.sessions_moved = 0
+        self.unrouted: Deque[Dict[str, Any]] = deque()
+
+    def _worker_env(self, worker: Worker) -> Dict[str, str]:
+        env = dict(os.environ)
+        count = len(self.workers)
+        env.update({
+            "CLUSTER_WORKER_ID": worker.name,
+            "CLUSTER_SECRET": self.secret,
+            # העדכונים מגיעים מהתהליך הקדמי; ה-worker לא רושם webhook ולא עושה polling
+            "BOT_MODE": "webhook",
+            "WEBHOOK_URL": "",
+            # מגבלות הקצב הן לבוט כולו - כל worker מקבל חלק שווה
+            "LLM_RATE_PER_SEC": str(LLM_RATE_PER_SEC / count),
+            "SEND_GLOBAL_RATE": str(SEND_GLOBAL_RATE / count),
+        })
+        return env
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=CLUSTER_HANDOFF_TIMEOUT + 10)
+        self._open.set()
+        for worker in self.workers.values():
+            self._tasks.append(asyncio.create_task(self._supervise(worker)))
+            self._tasks.append(asyncio.create_task(self._forward(worker)))
+
+    async def stop(self):
+        # מכאן ה-webhook מחזיר 503 (טלגרם ישלח שוב); מה שכבר בתורים נשלח לפני העצירה
+        self._stopping = True
+        await self._flush(SHUTDOWN_DRAIN_TIMEOUT)
+        for task in self._tasks:
+            task.cancel()
+        for worker in self.workers.values():
+            if worker.process and worker.process.returncode is None:
+                worker.process.terminate()
+        # כל worker מסיים את העדכונים שבטיפול ושומר snapshot לפני שהוא יוצא
+        for worker in self.workers.values():
+            if worker.process:
+                try:
+                    await asyncio.wait_for(worker.process.wait(), SHUTDOWN_DRAIN_TIMEOUT + 10)
+                except asyncio.TimeoutError:
+                    worker.process.kill()
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def _flush(self, timeout: float):
+        """המתנה עד שכל העדכונים שבתורים נשלחו ל-workers (עד timeout)"""
+        deadline = time.monotonic() + timeout
+        while any(worker.pending or worker.lock.locked() for worker in self.workers.values()):
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.05)
+        left = sum(len(worker.pending) for worker in self.workers.values()) + len(self.unrouted)
+        if left:
+            print(f"⚠️ {left} עדכונים לא נשלחו ל-workers לפני הכיבוי")
+
+    # ניתוב
+
+    def dispatch(self, update: Dict[str, Any]):
+        """שיוך עדכון ל-worker לפי המשתמש והוספתו לתור השליחה שלו"""
+        self.dispatched += 1
+        try:
+            worker = self.workers[self.ring.node_for(update_user_key(update))]
+        except LookupError:
+            # אף worker עוד לא עלה - ינותב באיזון הבא
+            self.unrouted.append(update)
+            return
+        worker.pending.append(update)
+        worker.ready.set()
+
+    async def _forward(self, worker: Worker):
+        while True:
+            await worker.ready.wait()
+            await self._open.wait()
+            async with worker.lock:
+                # נבדק שוב בתוך המנעול - איזון מחדש עשוי להתחיל בינתיים
+                if not self._open.is_set() or not worker.pending:
+                    if not worker.pending:
+                        worker.ready.clear()
+                    continue
+                batch = [worker.pending.popleft() for _ in range(min(self.batch, len(worker.pending)))]
+                if not worker.pending:
+                    worker.ready.clear()
+                try:
+                    response = await self._client.post(
+                        f"{worker.url}/cluster/updates",
+                        json=batch,
+                        headers={SECRET_HEADER: self.secret},
+                    )
+                    response.raise_for_status()
+                    worker.forwarded += len(batch)
+                    continue
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code < 500:
+                        # ה-worker דחה את האצווה עצמה - שליחה חוזרת תידחה שוב
+                        print(f"⚠️ {worker.name} דחה אצווה של {len(batch)} עדכונים: {e.response.status_code}")
+                        continue
+                    worker.pending.extendleft(reversed(batch))
+                    worker.ready.set()
+                    print(f"⚠️ שליחה ל-{worker.name} נכשלה: {e.response.status_code}")
+                except httpx.HTTPError as e:
+                    # ה-worker לא זמין: האצווה חוזרת לראש התור עד שהמפקח יסיר אותו מהטבעת
+                    worker.pending.extendleft(reversed(batch))
+                    worker.ready.set()
+                    print(f"⚠️ שליחה ל-{worker.name} נכשלה: {type(e).__name__}")
+            await asyncio.sleep(0.2)
+
+    # הפעלה ופיקוח
+
+    async def _spawn(self, worker: Worker) -> bool:
+        """הפעלת התהליך והמתנה ל-/health (False אם יצא לפני שעלה)"""
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "app.main:api",
+            "--host", "127.0.0.1", "--port", str(worker.port), "--log-level", "warning",
+            env=self._worker_env(worker),
+        )
+        worker.started_at = time.monotonic()
+        while worker.process.returncode is None:
+            try:
+                response = await self._client.get(f"{worker.url}/health", timeout=1)
+                if response.status_code == 200:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+        return False
+
+    async def _supervise(self, worker: Worker):
+        delay = 1.0
+        while not self._stopping:
+            if await self._spawn(worker) and await self._rebalance(join=worker.name):
+                print(f"✅ {worker.name} פעיל (pid {worker.process.pid}, port {worker.port})")
+                code = await worker.process.wait()
+                await self._rebalance(leave=worker.name)
+            else:
+                # לא עלה, או שהסשנים שלו לא נטענו - מפעילים מחדש
+                if worker.process.returncode is None:
+                    worker.process.terminate()
+                code = await worker.process.wait()
+            if self._stopping:
+                return
+            worker.restarts += 1
+            uptime = time.monotonic() - worker.started_at
+            delay = 1.0 if uptime > _STABLE_UPTIME else min(delay * 2, _MAX_RESTART_DELAY)
+            print(f"⚠️ {worker.name} יצא (קוד {code}) - הפעלה מחדש בעוד {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    async def _rebalance(self, join: Optional[str] = None, leave: Optional[str] = None) -> bool:
+        """
+        מעבר לטבעת חדשה כש-worker מצטרף או עוזב
+
+        בהצטרפות: כל worker פעיל מוסר את הסשנים שעוברים לבעלים אחר,
+        והם נטענים אצל הבעלים החדש. אם הטעינה נכשלה הטבעת לא משתנה
+        (False) והסשנים נשארים אצל הבעלים הקודמים. בעזיבה (נפילה) הסשנים
+        שהיו בזיכרון של ה-worker אבדו - המשתמשים שלו מתחילים מחדש אצל השכנים.
+        """
+        async with self._rebalance_lock:
+            self._open.clear()
+            try:
+                # המתנה לאצוות שכבר בדרך
+                for worker in self.workers.values():
+                    async with worker.lock:
+                        pass
+
+                nodes = set(self.ring.nodes)
+                if join:
+                    nodes.add(join)
+                if leave:
+                    nodes.discard(leave)
+                ring = HashRing(nodes)
+
+                if join:
+                    sources = [self.workers[name] for name in self.ring.nodes - {join}]
+                    if not await self._handoff(sources, ring):
+                        print(f"⚠️ {join} לא צורף לטבעת - הסשנים נשארים אצל הבעלים הקודמים")
+                        return False
+
+                self.ring = ring
+                self.rebalances += 1
+                self._reroute()
+                return True
+            finally:
+                self._open.set()
+
+    async def _post(self, worker: Worker, path: str, body: Dict[str, Any]) -> Any:
+        response = await self._client.post(
+            f"{worker.url}{path}", json=body, headers={SECRET_HEADER: self.secret}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _handoff(self, sources: List[Worker], ring: HashRing) -> bool:
+        """
+        העברת סשנים בשני שלבים
+
+        1. כל מקור מוסר עותק של הסשנים שעוברים, והם נטענים אצל הבעלים החדש
+        2. רק אחרי שכל הטעינות הצליחו המקורות מוחקים אותם (ack)
+
+        טעינה שנכשלה מחזירה False בלי ack - שום סשן לא אובד.
+        """
+        offered: List[Tuple[Worker, Dict[str, Any]]] = []
+        for source in sources:
+            try:
+                body = await self._post(
+                    source, "/cluster/handoff", {"nodes": sorted(ring.nodes), "vnodes": ring.vnodes}
+                )
+                offered.append((source, body["sessions"]))
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                # המקור לא זמין - הסשנים שלו אבדו ממילא, והמפקח שלו יפעיל אותו מחדש
+                print(f"⚠️ העברת סשנים מ-{source.name} נכשלה: {type(e).__name__}")
+
+        by_owner: Dict[str, Dict[str, Any]] = {}
+        for _, sessions in offered:
+            for user_id, data in sessions.items():
+                by_owner.setdefault(ring.node_for(int(user_id)), {})[user_id] = data
+        for owner, sessions in by_owner.items():
+            try:
+                await self._post(self.workers[owner], "/cluster/sessions", {"sessions": sessions})
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"⚠️ טעינת {len(sessions)} סשנים ב-{owner} נכשלה: {type(e).__name__}")
+                return False
+
+        for source, sessions in offered:
+            if not sessions:
+                continue
+            self.sessions_moved += len(sessions)
+            try:
+                await self._post(source, "/cluster/handoff/ack", {"user_ids": [int(u) for u in sessions]})
+            except (httpx.HTTPError, ValueError) as e:
+                # הסשנים כבר אצל הבעלים החדש; העותק שנשאר במקור יפוג ב-TTL
+                print(f"⚠️ אישור ההעברה ל-{source.name} נכשל: {type(e).__name__}")
+        return True
+
+    def _reroute(self):
+        """ניתוב מחדש של עדכונים ממתינים לפי הטבעת הנוכחית (שומר על הסדר לכל משתמש)"""
+        waiting = list(self.unrouted)
+        self.unrouted.clear()
+        for worker in self.workers.values():
+            waiting.extend(worker.pending)
+            worker.pending.clear()
+            worker.ready.clear()
+        self.dispatched -= len(waiting)
+        for update in waiting:
+            self.dispatch(update)
+
+    # קבלת עדכונים מטלגרם
+
+    async def poll(self):
+        """קבלת עדכונים ב-long polling (כשאין webhook)"""
+        base = f"{TELEGRAM_BASE_URL}{TELEGRAM_BOT_TOKEN}"
+        await self._client.post(f"{base}/deleteWebhook")
+        offset = 0
+        while not self._stopping:
+            try:
+                response = await self._client.post(
+                    f"{base}/getUpdates", json={"offset": offset, "timeout": 30}, timeout=40
+                )
+                response.raise_for_status()
+                for update in response.json().get("result", []):
+                    offset = update["update_id"] + 1
+                    self.dispatch(update)
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"⚠️ getUpdates נכשל: {type(e).__name__}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ring": sorted(self.ring.nodes),
+            "dispatched": self.dispatched,
+            "unrouted": len(self.unrouted),
+            "rebalances": self.rebalances,
+            "sessions_moved": self.sessions_moved,
+            "workers": {name: worker.stats() for name, worker in self.workers.items()},
+        }
+
+
+# התהליך הקדמי
+
+front_api = FastAPI(title="AI LegalMind cluster")
+FRONT = ClusterFront()
+
+
+@front_api.get("/health")
+def health():
+    return {"status": "ok", "workers": len(FRONT.ring.nodes)}
+
+
+@front_api.get("/stats")
+def stats():
+    return FRONT.stats()
+
+
+@front_api.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    """קבלת עדכון מטלגרם וניתובו ל-worker של המשתמש"""
+    if FRONT._stopping:
+        raise HTTPException(status_code=503, detail="shutting down")
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not WEBHOOK_SECRET or not secrets.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="invalid secret token")
+    try:
+        update = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid update")
+    if not isinstance(update, dict):
+        raise HTTPException(status_code=400, detail="invalid update")
+    FRONT.dispatch(update)
+    return {"ok": True}
+
+
+@front_api.on_event("startup")
+async def startup():
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET חובה במצב webhook")
+    await FRONT.start()
+    if not TELEGRAM_BOT_TOKEN:
+        print("⚠️ TELEGRAM_BOT_TOKEN לא מוגדר")
+        return
+    if BOT_MODE == "webhook":
+        if WEBHOOK_URL:
+            await FRONT._client.post(
+                f"{TELEGRAM_BASE_URL}{TELEGRAM_BOT_TOKEN}/setWebhook",
+                json={"url": f"{WEBHOOK_URL}{WEBHOOK_PATH}", "secret_token": WEBHOOK_SECRET},
+            )
+        print(f"✅ Cluster started (webhook, {len(FRONT.workers)} workers).")
+        return
+    FRONT._tasks.append(asyncio.create_task(FRONT.poll()))
+    print(f"✅ Cluster started (polling, {len(FRONT.workers)} workers).")
+
+
+@front_api.on_event("shutdown")
+async def shutdown():
+    await FRONT.stop()
+
+
+def main():
+    uvicorn.run(front_api, host=CLUSTER_HOST, port=CLUSTER_PORT, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """
+    איחוד קריאות מקבילות זהות לקריאה אחת
+
+    הקורא הראשון למפתח מפעיל את הקריאה, וכל קורא נוסף עם אותו מפתח
+    בזמן שהיא רצה ממתין לאותה תוצאה (או לאותה חריגה).
+    """
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.peak_waiters = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # הקריאה רצה כמשימה עצמאית - ביטול של קורא אחד לא מבטל לאחרים
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            self.leaders += 1
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.peak_waiters = max(self.peak_waiters, self._waiters[key])
+
+        return await asyncio.shield(task)
+
+    async def wait(self, key: str) -> Optional[Any]:
+        """הצטרפות לקריאה שכבר רצה, בלי להפעיל חדשה (None אם אין)"""
+        task = self._calls.get(key)
+        if task is None:
+            return None
+        self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: "asyncio.Task[Any]"):
+        self._calls.pop(key, None)
+        self._waiters.pop(key, None)
+        # סימון החריגה כנקראה גם אם כל הממתינים בוטלו
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced_waiters": self.coalesced,
+            "peak_waiters": self.peak_waiters,
+            "in_flight": len(self._calls),
+        }
+
+
+# קריאות ניתוח שרצות כרגע, לפי מפתח המטמון
+ANALYSIS_FLIGHTS = SingleFlight()
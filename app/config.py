@@ -3,7 +3,118 @@ import os
 
 load_dotenv()
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    """קריאת משתנה סביבה בוליאני"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+DEEPSEEK_URL = os.getenv("DEEPSEEK_URL", "https://api.deepseek.com/v1/chat/completions")
+
+# מאגר חיבורי HTTP משותף ל-DeepSeek
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "40"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED", True)
+
+# מטמון ניתוחים (memory / sqlite / off)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "analysis_cache.db")
+
+# תקציב טוקנים: אורך התשובה ותקציב לתוכן המשתמש בבקשה (0 = ללא קיצור)
+DEEPSEEK_MAX_TOKENS = int(os.getenv("DEEPSEEK_MAX_TOKENS", "600"))
+PROMPT_USER_TOKEN_BUDGET = int(os.getenv("PROMPT_USER_TOKEN_BUDGET", "1500"))
+
+# פורמט התשובה מהמודל: prompt (הוראות בפרומפט), json_object או tool
+ANALYSIS_OUTPUT_MODE = os.getenv("ANALYSIS_OUTPUT_MODE", "prompt").strip().lower()
+
+# סיווג מקומי מהיר: off / background (המודל רץ ברקע) / skip (בלי מודל)
+FAST_PATH_MODE = os.getenv("FAST_PATH_MODE", "off").strip().lower()
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.65"))
+
+# קבלת תשובת המודל ב-streaming ושליחת שאלת ההמשך הראשונה מוקדם
+DEEPSEEK_STREAM = _env_bool("DEEPSEEK_STREAM", False)
+
+# עמידות הקריאה ל-DeepSeek: ניסיונות חוזרים, hedging, תקציב זמן ומפסק
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", False)
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+ENDPOINT_DEADLINES = {
+    "analysis": float(os.getenv("DEADLINE_ANALYSIS", "30")),
+    "refine": float(os.getenv("DEADLINE_REFINE", "20")),
+}
+
+# בקרת כניסה לקריאות LLM: מקביליות, קצב (לפי מכסת ה-API) ותור
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "5"))
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "500"))
+
+# קבלת עדכונים מטלגרם: polling (ברירת מחדל) או webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# אחסון סשנים (memory / sqlite / redis)
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE", "memory").strip().lower()
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(2 * 60 * 60)))
+SESSION_EXPIRY_INTERVAL = float(os.getenv("SESSION_EXPIRY_INTERVAL", "60"))
+
+# עיבוד עדכונים מקבילי בין משתמשים, בסדר קפדני לכל משתמש
+BOT_MAX_CONCURRENT_UPDATES = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "64"))
+USER_MAILBOX_LIMIT = int(os.getenv("USER_MAILBOX_LIMIT", "20"))
+
+# מאגר הידע (המלצות, משאבים ושאלות המשך) - קובץ JSON עם טעינה מחדש חמה
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "knowledge_base.json"),
+)
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "30"))
+KB_LOAD_BUDGET_MS = float(os.getenv("KB_LOAD_BUDGET_MS", "200"))
+
+# ניתוח מחודש (חידוד) אחרי שכל שאלות ההמשך נענו - כבוי כברירת מחדל
+REFINE_ENABLED = _env_bool("REFINE_ENABLED", False)
+REFINE_WINDOW = float(os.getenv("REFINE_WINDOW", "0.2"))
+REFINE_MAX_BATCH = int(os.getenv("REFINE_MAX_BATCH", "16"))
+
+# שליחת הודעות לטלגרם: קצב גלובלי ולכל צ'אט, וניסיונות חוזרים אחרי RetryAfter
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_GLOBAL_BURST = int(os.getenv("SEND_GLOBAL_BURST", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "5"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# מצב cluster: תהליך קדמי שמנתב עדכונים ל-workers לפי המשתמש (python -m app.cluster)
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", str(os.cpu_count() or 1)))
+CLUSTER_HOST = os.getenv("CLUSTER_HOST", "0.0.0.0")
+CLUSTER_PORT = int(os.getenv("CLUSTER_PORT", "8000"))
+CLUSTER_BASE_PORT = int(os.getenv("CLUSTER_BASE_PORT", "8100"))
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "64"))
+CLUSTER_BATCH = int(os.getenv("CLUSTER_BATCH", "64"))
+CLUSTER_HANDOFF_TIMEOUT = float(os.getenv("CLUSTER_HANDOFF_TIMEOUT", "30"))
+# נקבעים ע"י התהליך הקדמי בסביבה של כל worker
+CLUSTER_WORKER_ID = os.getenv("CLUSTER_WORKER_ID", "")
+CLUSTER_SECRET = os.getenv("CLUSTER_SECRET", "")
+
+# כיבוי מסודר: זמן מקסימלי לסיום העדכונים שבטיפול, ו-snapshot של הסשנים ("" = ללא)
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+SESSION_SNAPSHOT_PATH = os.getenv("SESSION_SNAPSHOT_PATH", "sessions.snapshot.jsonl")
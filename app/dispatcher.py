@@ -0,0 +1,138 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional, Set
+from telegram.ext import BaseUpdateProcessor
+from app.config import BOT_MAX_CONCURRENT_UPDATES, USER_MAILBOX_LIMIT
+from app.outbound import OUTBOX
+
+BUSY_MESSAGE = (
+    "יש כבר כמה הודעות שלך שממתינות לטיפול - ההודעה האחרונה לא נקלטה.\n"
+    "נא להמתין לתשובה ולשלוח שוב."
+)
+
+
+def _user_key(update: object) -> Optional[int]:
+    """מזהה המשתמש (או הצ'אט) שאליו שייך העדכון"""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    מעבד עדכונים: משתמשים שונים במקביל, הודעות של אותו משתמש לפי הסדר
+
+    לכל משתמש עם עדכון בטיפול יש "תיבת דואר". עדכון שמגיע בזמן שתיבת
+    המשתמש פעילה נכנס לתור שלה ומשחרר מיד את מקומו במגבלת המקביליות;
+    העדכון הפעיל מרוקן את התיבה לפי הסדר. כשאין עוד עבודה התיבה נמחקת,
+    כך שהזיכרון תלוי רק במספר המשתמשים הפעילים כרגע.
+    """
+    def __init__(
+        self,
+        max_concurrent_updates: int = BOT_MAX_CONCURRENT_UPDATES,
+        mailbox_limit: int = USER_MAILBOX_LIMIT,
+    ):
+        super().__init__(max_concurrent_updates)
+        self.mailbox_limit = mailbox_limit
+        self._mailboxes: Dict[int, Deque[Awaitable[Any]]] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # משתמשים שכבר קיבלו הודעת עומס מאז שהתיבה שלהם נפתחה
+        self._notified: Set[int] = set()
+        self._notices: Set[asyncio.Task] = set()
+        self.counters: Dict[str, int] = {
+            "processed": 0,
+            "queued_behind_user": 0,
+            "dropped": 0,
+            "busy_replies": 0,
+            "peak_active_users": 0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        try:
+            await coroutine
+        except Exception as e:
+            # process_update של PTB מטפל בשגיאות handlers; זו רשת ביטחון
+            print(f"שגיאה בעיבוד עדכון: {e}")
+        self.counters["processed"] += 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        key = _user_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        mailbox = self._mailboxes.get(key)
+        if mailbox is not None:
+            if len(mailbox) >= self.mailbox_limit:
+                self.counters["dropped"] += 1
+                coroutine.close()
+                print(f"יותר מדי הודעות ממתינות למשתמש {key} - ההודעה נזרקה")
+                # הודעת עומס אחת לכל תיבה - לא תשובה לכל הודעה בהצפה
+                if key not in self._notified:
+                    self._notified.add(key)
+                    self._notify_busy(update)
+                return
+            mailbox.append(coroutine)
+            self.counters["queued_behind_user"] += 1
+            return
+
+        mailbox = self._mailboxes[key] = deque()
+        self._idle.clear()
+        self.counters["peak_active_users"] = max(
+            self.counters["peak_active_users"], len(self._mailboxes)
+        )
+        try:
+            await self._run(coroutine)
+            while mailbox:
+                await self._run(mailbox.popleft())
+        finally:
+            # בביטול: עדכונים שנשארו בתיבה לא יטופלו
+            for pending in mailbox:
+                pending.close()
+            del self._mailboxes[key]
+            self._notified.discard(key)
+            if not self._mailboxes:
+                self._idle.set()
+
+    def _notify_busy(self, update: object):
+        """הודעת עומס למשתמש, ברקע - לא מעכבת את עיבוד העדכונים"""
+        message = getattr(update, "effective_message", None)
+        if message is None:
+            return
+        self.counters["busy_replies"] += 1
+        task = asyncio.ensure_future(OUTBOX.reply(message, BUSY_MESSAGE))
+        self._notices.add(task)
+        task.add_done_callback(self._notice_done)
+
+    def _notice_done(self, task: asyncio.Task):
+        self._notices.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"שליחת הודעת עומס נכשלה: {task.exception()}")
+
+    @property
+    def in_flight(self) -> int:
+        """עדכונים בטיפול או ממתינים בתיבות המשתמשים"""
+        return sum(1 + len(mailbox) for mailbox in self._mailboxes.values())
+
+    async def wait_idle(self):
+        """המתנה עד שאין אף עדכון בטיפול"""
+        await self._idle.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.counters)
+        stats["active_users"] = len(self._mailboxes)
+        stats["in_flight"] = self.in_flight
+        stats["running"] = self.current_concurrent_updates
+        stats["max_concurrent_updates"] = self.max_concurrent_updates
+        return stats
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List
+from app.config import SESSION_EXPIRY_INTERVAL
+from app.session_store import SessionStore
+
+ExpireHook = Callable[[List[int]], None]
+
+
+class SessionExpiry:
+    """
+    הפעלה מחזורית של תפוגת סשנים מול האחסון, עם סטטיסטיקה לכל סבב
+    """
+    def __init__(self, store: SessionStore, interval: float = SESSION_EXPIRY_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.hooks: List[ExpireHook] = []
+        self.stats_data: Dict[str, Any] = {
+            "ticks": 0,
+            "expired_total": 0,
+            "last_expired": 0,
+            "last_examined": 0,
+            "last_tick_ms": 0.0,
+            "max_tick_ms": 0.0,
+        }
+
+    def on_expire(self, hook: ExpireHook):
+        """רישום פונקציה שתקבל את מזהי המשתמשים שפג תוקפם"""
+        self.hooks.append(hook)
+
+    async def tick(self) -> int:
+        """סבב תפוגה אחד"""
+        started = time.perf_counter()
+        expired, examined = await self.store.expire()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        for hook in self.hooks:
+            hook(expired)
+
+        stats = self.stats_data
+        stats["ticks"] += 1
+        stats["expired_total"] += len(expired)
+        stats["last_expired"] = len(expired)
+        stats["last_examined"] = examined
+        stats["last_tick_ms"] = round(elapsed_ms, 3)
+        stats["max_tick_ms"] = max(stats["max_tick_ms"], stats["last_tick_ms"])
+
+        if expired:
+            print(f"נוקו {len(expired)} סשנים לא פעילים")
+        return len(expired)
+
+    async def run(self):
+        """לולאה שרצה כמשימת asyncio מ-startup"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"שגיאה בניקוי סשנים: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats_data)
+        stats["interval_seconds"] = self.interval
+        return stats
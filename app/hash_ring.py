@@ -0,0 +1,40 @@
+"""
+הטבעת של מצב cluster - משותפת לתהליך הקדמי ול-workers
+
+מודול נפרד כדי ש-app.main (ה-worker) לא יטען את app.cluster, שיוצר את
+התהליך הקדמי בזמן import.
+"""
+import hashlib
+from bisect import bisect
+from typing import Any, Iterable
+
+from app.config import CLUSTER_VNODES
+
+# כותרת האימות בין התהליך הקדמי ל-workers
+SECRET_HEADER = "X-Cluster-Secret"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    טבעת consistent hashing עם צמתים וירטואליים
+
+    הוספה או הסרה של צומת מזיזה רק את המפתחות שבקטעים שלו.
+    """
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = CLUSTER_VNODES):
+        self.vnodes = vnodes
+        self.nodes = frozenset(nodes)
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: Any) -> str:
+        if not self._hashes:
+            raise LookupError("אין workers זמינים בטבעת")
+        i = bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._owners[i]
@@ -0,0 +1,108 @@
+import httpx
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+from app.config import (
+    HTTP_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+)
+
+# לקוח HTTP אחד לכל התהליך - נוצר ב-startup ונסגר ב-shutdown
+_client: Optional[httpx.AsyncClient] = None
+
+_stats: Dict[str, int] = {
+    "clients_created": 0,
+    "requests": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+}
+
+
+def _http2_available() -> bool:
+    """בדיקה האם חבילת h2 מותקנת"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    """יצירת לקוח עם מאגר חיבורים מוגבל ו-keep-alive"""
+    http2 = HTTP2_ENABLED and _http2_available()
+    if HTTP2_ENABLED and not http2:
+        print("⚠️ חבילת h2 לא מותקנת, ממשיך עם HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    _stats["clients_created"] += 1
+    return httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=limits, http2=http2)
+
+
+async def start_client() -> httpx.AsyncClient:
+    """פתיחת הלקוח המשותף (נקרא מ-startup של FastAPI)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_client():
+    """סגירת הלקוח המשותף ושחרור כל החיבורים"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    קבלת הלקוח המשותף
+
+    אם השרת לא אתחל את הלקוח (למשל בסקריפט), נוצר לקוח בעצלתיים.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+@asynccontextmanager
+async def track_request():
+    """ספירת בקשות פעילות לצורך סטטיסטיקת ניצולת המאגר"""
+    _stats["requests"] += 1
+    _stats["in_flight"] += 1
+    _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    try:
+        yield
+    finally:
+        _stats["in_flight"] -= 1
+
+
+def pool_stats() -> Dict[str, Any]:
+    """סטטיסטיקת ניצולת מאגר החיבורים"""
+    stats: Dict[str, Any] = dict(_stats)
+    stats["max_connections"] = HTTP_MAX_CONNECTIONS
+    stats["max_keepalive"] = HTTP_MAX_KEEPALIVE
+    stats["http2"] = HTTP2_ENABLED and _http2_available()
+
+    connections = []
+    if _client is not None and not _client.is_closed:
+        # httpx לא חושף את המאגר באופן ציבורי - קריאה זהירה מ-httpcore
+        pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+
+    idle = sum(1 for c in connections if c.is_idle())
+    stats["open_connections"] = len(connections)
+    stats["idle_connections"] = idle
+    stats["active_connections"] = len(connections) - idle
+    stats["utilisation"] = (
+        round((len(connections) - idle) / HTTP_MAX_CONNECTIONS, 3)
+        if HTTP_MAX_CONNECTIONS else 0.0
+    )
+    return stats
@@ -0,0 +1,228 @@
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.schemas import Analysis
+
+# ערכי ברירת מחדל לשדות שהמודל השמיט
+DEFAULTS: Dict[str, Any] = {
+    "category": "אחר",
+    "complexity": "בינונית",
+    "summary": "התיק התקבל ונמצא בבדיקה",
+    "missing_info": [],
+    "confidence": 0.5,
+}
+
+_SMART_QUOTES = "“”„"
+_STRUCTURAL = re.compile(r'[{}"\\]')
+
+
+def _is_hebrew(ch: str) -> bool:
+    return "א" <= ch <= "ת"
+
+
+def _is_gershayim(text: str, i: int) -> bool:
+    """מירכאה בין שתי אותיות עבריות (ש"ח, עו"ד) אינה סוף מחרוזת"""
+    return 0 < i < len(text) - 1 and _is_hebrew(text[i - 1]) and _is_hebrew(text[i + 1])
+
+
+def find_objects(text: str) -> List[Tuple[int, int]]:
+    """
+    מיקומי האובייקטים החיצוניים המאוזנים בטקסט, במעבר אחד
+
+    סוגריים בתוך מחרוזות לא נספרים, ו-{ שלא נסגר (למשל בטקסט חופשי לפני
+    ה-JSON) לא מסתיר אובייקטים שלמים שבתוכו. זמן ריצה ליניארי בכל קלט.
+    """
+    spans: List[Tuple[int, int]] = []
+    stack: List[int] = []
+    in_string = False
+    escaped = -1
+    # רק תווים מבניים נבדקים; כל השאר מדולג ברמת ה-C של מנוע הביטויים
+    for match in _STRUCTURAL.finditer(text):
+        i = match.start()
+        if i == escaped:
+            continue
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                escaped = i + 1
+            elif ch == '"' and not _is_gershayim(text, i):
+                in_string = False
+        elif ch == '"':
+            # מחרוזות נספרות רק בתוך אובייקט - מירכאות בטקסט החופשי לא משנות
+            in_string = bool(stack)
+        elif ch == "{":
+            stack.append(i)
+        elif ch == "}" and stack:
+            spans.append((stack.pop(), i + 1))
+
+    # אובייקטים שלמים מסודרים לפי סופם; שומרים רק את אלה שלא מוכלים באחר
+    outer: List[Tuple[int, int]] = []
+    for start, end in reversed(spans):
+        if not outer or end <= outer[-1][0]:
+            outer.append((start, end))
+    outer.reverse()
+    return outer
+
+
+def repair(candidate: str) -> str:
+    """
+    תיקון פגמים נפוצים בפלט המודל, במעבר אחד שמכיר מחרוזות
+
+    - פסיק לפני } או ] (trailing comma)
+    - מירכאות "חכמות" כתוחמי מחרוזת
+    - מירכאה ישרה בתוך ראשי תיבות בעברית (ש"ח) - מוחלפת ב-escape
+    """
+    out: List[str] = []
+    in_string = False
+    smart = False
+    i = 0
+    n = len(candidate)
+    while i < n:
+        ch = candidate[i]
+        if in_string:
+            if ch == "\\" and i + 1 < n:
+                out.append(candidate[i:i + 2])
+                i += 2
+                continue
+            if ch == '"':
+                if _is_gershayim(candidate, i):
+                    out.append('\\"')
+                else:
+                    out.append('"')
+                    in_string = False
+            elif smart and ch in _SMART_QUOTES:
+                out.append('"')
+                in_string = False
+            else:
+                out.append(ch)
+        elif ch == '"' or ch in _SMART_QUOTES:
+            out.append('"')
+            in_string = True
+            smart = ch != '"'
+        elif ch == ",":
+            j = i + 1
+            while j < n and candidate[j].isspace():
+                j += 1
+            if j < n and candidate[j] in "}]":
+                i = j
+                continue
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _load(candidate: str) -> Any:
+    """פענוח מועמד, ובכישלון - ניסיון נוסף אחרי תיקון"""
+    try:
+        return json.loads(candidate, strict=False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(repair(candidate), strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+def extract_object(text: str) -> Dict[str, Any]:
+    """
+    חילוץ אובייקט ה-JSON מתשובת המודל
+
+    עובד גם עם code block, טקסט לפני ואחרי ו-JSON עם פגמים קלים.
+    מועדף האובייקט הראשון שיש בו שדה של Analysis.
+
+    Raises:
+        ValueError: אם אין בטקסט אובייקט JSON תקין
+    """
+    first = None
+    for start, end in find_objects(text):
+        data = _load(text[start:end])
+        if not isinstance(data, dict):
+            continue
+        if not data.keys().isdisjoint(DEFAULTS):
+            return data
+        if first is None:
+            first = data
+    if first is not None:
+        return first
+    raise ValueError("לא ניתן לחלץ נתוני JSON תקינים מהתשובה")
+
+
+def _parse_direct(text: str) -> Optional[Analysis]:
+    """פענוח ואימות בצעד אחד של pydantic; None אם הטקסט אינו JSON תקין של Analysis"""
+    try:
+        analysis = Analysis.model_validate_json(text)
+    except ValidationError:
+        return None
+    # ברירת המחדל לביטחון כשהמודל השמיט אותו שונה מזו של הסכמה
+    if "confidence" not in analysis.model_fields_set:
+        analysis.confidence = DEFAULTS["confidence"]
+    return analysis
+
+
+def _parse_extracted(text: str) -> Analysis:
+    return Analysis.model_validate({**DEFAULTS, **extract_object(text)})
+
+
+def parse_analysis(text: str) -> Analysis:
+    """
+    פענוח תשובת המודל ל-Analysis
+
+    קודם ניסיון ישיר, ורק אם נכשל - חילוץ, תיקון והשלמת שדות חסרים.
+
+    Raises:
+        ValueError: אם אין JSON תקין או שהערכים לא עוברים אימות
+    """
+    return _parse_direct(text) or _parse_extracted(text)
+
+
+class ParseStats:
+    """כמה תשובות פוענחו ישירות, כמה דרך החילוץ וכמה נכשלו - לפי מצב הפלט"""
+    def __init__(self):
+        self._modes: Dict[str, Dict[str, float]] = {}
+
+    def parse(self, text: str, mode: str) -> Analysis:
+        """פענוח עם מדידה; חריגות עוברות לקורא"""
+        stats = self._modes.setdefault(mode, {
+            "direct": 0, "extracted": 0, "failed": 0, "parse_seconds": 0.0,
+        })
+        started = time.perf_counter()
+        try:
+            analysis = _parse_direct(text)
+            if analysis is not None:
+                stats["direct"] += 1
+                return analysis
+            analysis = _parse_extracted(text)
+            stats["extracted"] += 1
+            return analysis
+        except ValueError:
+            stats["failed"] += 1
+            raise
+        finally:
+            stats["parse_seconds"] += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for mode, stats in self._modes.items():
+            total = stats["direct"] + stats["extracted"] + stats["failed"]
+            result[mode] = {
+                "direct": stats["direct"],
+                "extracted": stats["extracted"],
+                "failed": stats["failed"],
+                "failure_rate": round(stats["failed"] / total, 4) if total else 0.0,
+                "avg_parse_ms": round(stats["parse_seconds"] / total * 1000, 3) if total else 0.0,
+            }
+        return result
+
+
+PARSE_STATS = ParseStats()
+
+
+def parse_stats() -> Dict[str, Any]:
+    """סטטיסטיקות הפענוח עבור /stats"""
+    return PARSE_STATS.stats()
@@ -0,0 +1,84 @@
+import json
+from typing import List, Tuple
+
+
+class IncrementalJSONScanner:
+    """
+    סורק JSON מצטבר לתשובה שמגיעה בחלקים (streaming)
+
+    מזהה שדות מחרוזת ברמה העליונה של האובייקט ברגע שהם הושלמו,
+    בלי לחכות לסוף התשובה. כל תו נסרק פעם אחת בלבד.
+    טקסט שלפני ה-'{' הראשון (למשל ```json) מדולג.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.done = False
+        self._in_string = False
+        self._escape = False
+        self._raw: List[str] = []
+        self._expect_key = True
+        self._key = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        הזנת חלק נוסף מהתשובה
+
+        Returns:
+            רשימת זוגות (שדה, ערך) שהושלמו בחלק הזה
+        """
+        completed: List[Tuple[str, str]] = []
+        for ch in chunk:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._raw.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._raw.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    if self.depth == 1:
+                        self._close_string(completed)
+                else:
+                    self._raw.append(ch)
+                continue
+
+            if self.depth == 0:
+                # מחכים לתחילת האובייקט
+                if ch == "{":
+                    self.depth = 1
+                    self._expect_key = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._raw = []
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+            elif self.depth == 1:
+                if ch == ":":
+                    self._expect_key = False
+                elif ch == ",":
+                    self._expect_key = True
+                    self._key = None
+
+        return completed
+
+    def _close_string(self, completed: List[Tuple[str, str]]):
+        try:
+            text = json.loads('"' + "".join(self._raw) + '"')
+        except json.JSONDecodeError:
+            text = "".join(self._raw)
+
+        if self._expect_key:
+            self._key = text
+        elif self._key is not None:
+            completed.append((self._key, text))
+            self._key = None
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import os
+import re
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, get_args
+from app.config import KNOWLEDGE_BASE_PATH, KB_RELOAD_INTERVAL, KB_LOAD_BUDGET_MS
+from app.schemas import Category, Complexity
+
+CATEGORIES = get_args(Category)
+COMPLEXITIES = get_args(Complexity)
+KINDS = ("bool", "number", "text")
+
+# יעד הסתעפות שמסיים את השאלון
+END = "END"
+
+# אותיות שימוש שיכולות להופיע לפני מילת מפתח (ו/ה/ב/ל/מ/ש/כ, עד שלוש: "וכשה").
+# לא חמדני: קודם המילה כולה ("הפרת", "הבוס") ורק אז בלי אותיות השימוש
+_PREFIXES = "[והבלמשכ]{0,3}?"
+
+
+class KnowledgeBaseError(ValueError):
+    """קובץ מאגר הידע אינו תקין"""
+
+
+def _text(value: Any) -> str:
+    """טקסט ארוך נשמר בקובץ כרשימת שורות (לנוחות עריכה) או כמחרוזת"""
+    if isinstance(value, list):
+        return "\n".join(value)
+    return value
+
+
+def _is_text(value: Any) -> bool:
+    return isinstance(value, str) or (
+        isinstance(value, list) and all(isinstance(line, str) for line in value)
+    )
+
+
+def _validate_followups(category: str, followups: Any, errors: List[str]):
+    if not isinstance(followups, list):
+        errors.append(f"{category}: followups חייב להיות רשימה")
+        return
+    if not all(isinstance(item, dict) for item in followups):
+        errors.append(f"{category}: כל שאלה ב-followups חייבת להיות אובייקט")
+        return
+
+    seen = set()
+    slots = [item.get("slot") for item in followups]
+    for idx, item in enumerate(followups):
+        for field in ("slot", "kind", "q"):
+            if not item.get(field) or not isinstance(item.get(field), str):
+                errors.append(f"{category}: שאלה {idx} ללא {field}")
+        if item.get("kind") not in KINDS:
+            errors.append(f"{category}: שאלה {idx} עם סוג לא מוכר {item.get('kind')}")
+        slot = item.get("slot")
+        if isinstance(slot, str):
+            if slot in seen:
+                errors.append(f"{category}: השדה {slot} מופיע פעמיים")
+            seen.add(slot)
+
+        branch = item.get("branch", {})
+        if not isinstance(branch, dict):
+            errors.append(f"{category}: branch בשאלה {idx} חייב להיות מילון")
+            continue
+        for answer, target in branch.items():
+            if target != END and target not in slots[idx + 1:]:
+                errors.append(
+                    f"{category}: הסתעפות מ-{item.get('slot')} לשדה {target} שאינו שאלה מאוחרת יותר"
+                )
+
+
+def validate(data: Any):
+    """
+    בדיקת מבנה המאגר לפני החלפה
+
+    כל רמה נבדקת גם לסוג (מילון / רשימה / מחרוזת), כך שקובץ בצורה
+    שגויה נדחה כאן ולא נכשל בהידור.
+
+    Raises:
+        KnowledgeBaseError: עם רשימת כל הבעיות שנמצאו
+    """
+    if not isinstance(data, dict):
+        raise KnowledgeBaseError("המאגר חייב להיות אובייקט JSON")
+    errors: List[str] = []
+    categories = data.get("categories")
+    if not isinstance(categories, dict):
+        raise KnowledgeBaseError("חסר מפתח categories")
+    if "אחר" not in categories:
+        errors.append("חסרה קטגוריית ברירת המחדל 'אחר'")
+
+    for field in ("disclaimer", "default_recommendation"):
+        if not _is_text(data.get(field, "")):
+            errors.append(f"{field} חייב להיות מחרוזת או רשימת שורות")
+    slot_labels = data.get("slot_labels", {})
+    if not isinstance(slot_labels, dict) or not all(isinstance(v, str) for v in slot_labels.values()):
+        errors.append("slot_labels חייב להיות מילון של מחרוזות")
+
+    for category, entry in categories.items():
+        if category not in CATEGORIES:
+            errors.append(f"קטגוריה לא מוכרת: {category}")
+        if not isinstance(entry, dict):
+            errors.append(f"{category}: הקטגוריה חייבת להיות אובייקט")
+            continue
+
+        recommendations = entry.get("recommendations", {})
+        if not isinstance(recommendations, dict):
+            errors.append(f"{category}: recommendations חייב להיות מילון")
+        else:
+            for complexity, text in recommendations.items():
+                if complexity not in COMPLEXITIES:
+                    errors.append(f"{category}: רמת מורכבות לא מוכרת {complexity}")
+                if not _is_text(text):
+                    errors.append(f"{category}: המלצה {complexity} חייבת להיות מחרוזת או רשימת שורות")
+
+        resources = entry.get("resources", [])
+        if not isinstance(resources, list) or not all(isinstance(r, str) for r in resources):
+            errors.append(f"{category}: resources חייב להיות רשימה של מחרוזות")
+
+        keywords = entry.get("keywords", {})
+        if not isinstance(keywords, dict):
+            errors.append(f"{category}: keywords חייב להיות מילון")
+        else:
+            for term, weight in keywords.items():
+                if (not term.strip() or isinstance(weight, bool)
+                        or not isinstance(weight, (int, float)) or weight <= 0):
+                    errors.append(f"{category}: מילת מפתח לא תקינה {term!r}")
+
+        _validate_followups(category, entry.get("followups", []), errors)
+
+    if errors:
+        raise KnowledgeBaseError("; ".join(errors))
+
+
+class FollowupFlow:
+    """
+    שאלון המשך מהודר כמכונת מצבים
+
+    הסשן שומר רק את מספר השאלה הנוכחית (cursor). מעבר לשאלה הבאה,
+    ספירת השאלות שנותרו ובחירת השאלה הן חיפוש בטבלה בזמן קבוע.
+    אחרי טעינה מחדש של המאגר המספר עלול להצביע על שאלה אחרת, ולכן
+    המיקום של השאלה הפתוחה נמצא לפי שם השדה (index).
+    הסתעפויות (למשל דילוג על תגובת המוכר כשלא פנו אליו) מהודרות
+    לטבלת המעברים בזמן הטעינה.
+    """
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.steps: Tuple[Mapping[str, str], ...] = tuple(
+            MappingProxyType({"slot": item["slot"], "kind": item["kind"], "q": item["q"]})
+            for item in items
+        )
+        self.end = len(self.steps)
+        index = {step["slot"]: i for i, step in enumerate(self.steps)}
+        self.index: Mapping[str, int] = MappingProxyType(index)
+
+        # מעברים לפי תשובה; כל תשובה אחרת ממשיכה לשאלה הבאה
+        self.transitions: Tuple[Mapping[str, int], ...] = tuple(
+            MappingProxyType({
+                answer: self.end if target == END else index[target]
+                for answer, target in item.get("branch", {}).items()
+            })
+            for item in items
+        )
+        # מספר השאלות שנותרו במסלול הרגיל (כולל הנוכחית)
+        self.remaining: Tuple[int, ...] = tuple(self.end - i for i in range(self.end + 1))
+
+    def __len__(self) -> int:
+        return self.end
+
+    def step(self, cursor: int) -> Optional[Mapping[str, str]]:
+        """השאלה במיקום cursor, או None אם השאלון הסתיים"""
+        return self.steps[cursor] if cursor < self.end else None
+
+    def advance(self, cursor: int, answer: str) -> int:
+        """המיקום הבא אחרי תשובה לשאלה שבמיקום cursor"""
+        if cursor >= self.end:
+            return self.end
+        return self.transitions[cursor].get(answer, cursor + 1)
+
+    def resume(self, answered: Callable[[str], bool]) -> int:
+        """השאלה הראשונה שעוד לא נענתה (כשהשאלה הפתוחה הוסרה מהמאגר)"""
+        for cursor, step in enumerate(self.steps):
+            if not answered(step["slot"]):
+                return cursor
+        return self.end
+
+
+class KnowledgeBase:
+    """
+    אינדקס מהודר ובלתי ניתן לשינוי של מאגר הידע
+
+    כל הטקסטים הקבועים מוכנים מראש, כך שבנתיב החם יש רק חיפושים במילון.
+    """
+    def __init__(self, data: Dict[str, Any], source: str = ""):
+        self.version = data.get("version", 0)
+        self.source = source
+        self.disclaimer = _text(data.get("disclaimer", ""))
+        self.default_recommendation = _text(data.get("default_recommendation", ""))
+        self.slot_labels: Mapping[str, str] = MappingProxyType(dict(data.get("slot_labels", {})))
+
+        categories = data["categories"]
+        recommendations = {}
+        resources = {}
+        followups = {}
+        flows = {}
+        for category, entry in categories.items():
+            recommendations[category] = MappingProxyType({
+                complexity: _text(text)
+                for complexity, text in entry.get("recommendations", {}).items()
+            })
+            resources[category] = "\n".join(
+                f"{idx}. {resource}" for idx, resource in enumerate(entry.get("resources", []), 1)
+            )
+            flows[category] = FollowupFlow(entry.get("followups", []))
+            followups[category] = flows[category].steps
+
+        self.recommendations: Mapping[str, Mapping[str, str]] = MappingProxyType(recommendations)
+        self.resources: Mapping[str, str] = MappingProxyType(resources)
+        self.followups: Mapping[str, Tuple[Mapping[str, str], ...]] = MappingProxyType(followups)
+        self.flows: Mapping[str, FollowupFlow] = MappingProxyType(flows)
+
+        # מילות מפתח לסיווג המקומי: ביטוי אחד לכל המונחים, הארוך קודם
+        # ("חוזה שכירות" נספר פעם אחת ולא גם כ"חוזה"). מונח נספר רק כמילה
+        # שלמה, עם אותיות שימוש אופציונליות לפניו ("בפרטיות", "והמעסיק")
+        # - "הפר" לא נמצא בתוך "הפרטיות" ו"עובד" לא בתוך "העובדה"
+        keywords: Dict[str, List[Tuple[str, float]]] = {}
+        for category, entry in categories.items():
+            for term, weight in entry.get("keywords", {}).items():
+                keywords.setdefault(term.lower(), []).append((category, float(weight)))
+        self.keywords: Mapping[str, Tuple[Tuple[str, float], ...]] = MappingProxyType(
+            {term: tuple(hits) for term, hits in keywords.items()}
+        )
+        self.keyword_pattern: Optional["re.Pattern[str]"] = re.compile(
+            rf"(?<![\u0590-\u05FF\w]){_PREFIXES}("
+            + "|".join(re.escape(term) for term in sorted(keywords, key=len, reverse=True))
+            + r")(?![\u0590-\u05FF\w])"
+        ) if keywords else None
+
+        # סוף התשובה לכל צירוף (קטגוריה, מורכבות, משאבים) - מוכן מראש
+        tails = {}
+        for category in CATEGORIES:
+            for complexity in COMPLEXITIES:
+                for include_resources in (False, True):
+                    tails[(category, complexity, include_resources)] = self._render_tail(
+                        category, complexity, include_resources
+                    )
+        self.tails: Mapping[Tuple[str, str, bool], str] = MappingProxyType(tails)
+
+    def recommendation(self, category: str, complexity: str) -> str:
+        return self.recommendations.get(category, {}).get(complexity, self.default_recommendation)
+
+    def resources_for(self, category: str) -> str:
+        return self.resources.get(category, self.resources.get("אחר", ""))
+
+    def followups_for(self, category: str) -> Tuple[Mapping[str, str], ...]:
+        return self.followups.get(category, self.followups.get("אחר", ()))
+
+    def flow_for(self, category: str) -> FollowupFlow:
+        return self.flows.get(category) or self.flows["אחר"]
+
+    def _render_tail(self, category: str, complexity: str, include_resources: bool) -> str:
+        parts = ["\n\nהמלצות לפעולה:\n", self.recommendation(category, complexity)]
+        if include_resources:
+            parts.append("\n\nמשאבים משפטיים:\n")
+            parts.append(self.resources_for(category))
+        parts.append(f"\n\n{self.disclaimer}")
+        return "".join(parts)
+
+    def tail(self, category: str, complexity: str, include_resources: bool) -> str:
+        cached = self.tails.get((category, complexity, include_resources))
+        if cached is None:
+            return self._render_tail(category, complexity, include_resources)
+        return cached
+
+
+def load_knowledge_base(path: str = KNOWLEDGE_BASE_PATH) -> KnowledgeBase:
+    """טעינה, בדיקה והידור של מאגר הידע מקובץ"""
+    started = time.perf_counter()
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    validate(data)
+    kb = KnowledgeBase(data, source=path)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > KB_LOAD_BUDGET_MS:
+        print(f"⚠️ טעינת מאגר הידע ארכה {elapsed_ms:.0f}ms (תקציב: {KB_LOAD_BUDGET_MS:.0f}ms)")
+    return kb
+
+
+_current: KnowledgeBase = load_knowledge_base()
+_loaded_mtime: float = os.path.getmtime(KNOWLEDGE_BASE_PATH)
+
+
+def get_kb() -> KnowledgeBase:
+    """המאגר הנוכחי - יש לקרוא פעם אחת לכל פעולה כדי לעבוד מול גרסה אחת"""
+    return _current
+
+
+def reload_knowledge_base(path: Optional[str] = None) -> bool:
+    """
+    טעינה מחדש והחלפה אטומית של המאגר
+
+    אם הקובץ החדש לא תקין, המאגר הקיים נשאר בשימוש.
+    """
+    global _current, _loaded_mtime
+    path = path or KNOWLEDGE_BASE_PATH
+    try:
+        # נרשם גם בכישלון, כדי לא לנסות שוב את אותו קובץ שבור בכל סבב
+        _loaded_mtime = os.path.getmtime(path)
+        kb = load_knowledge_base(path)
+    except Exception as e:
+        # כל כשל (גם כזה שהבדיקה לא צפתה) משאיר את הגרסה הקיימת
+        print(f"שגיאה בטעינת מאגר הידע, ממשיך עם הגרסה הקיימת: {type(e).__name__}: {e}")
+        return False
+
+    _current = kb
+    print(f"✅ מאגר הידע נטען מחדש (גרסה {kb.version})")
+    return True
+
+
+async def watch_knowledge_base(interval: float = KB_RELOAD_INTERVAL):
+    """בדיקה מחזורית של זמן שינוי הקובץ וטעינה מחדש כשהשתנה"""
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if os.path.getmtime(KNOWLEDGE_BASE_PATH) != _loaded_mtime:
+                reload_knowledge_base()
+        except Exception as e:
+            # הלולאה חייבת לשרוד כל כשל, אחרת הטעינה החמה נעצרת בשקט
+            print(f"שגיאה בבדיקת קובץ מאגר הידע: {type(e).__name__}: {e}")
@@ -1,24 +1,260 @@
 import asyncio
-from fastapi import FastAPI
-from app.config import TELEGRAM_BOT_TOKEN
+import hmac
+from collections import OrderedDict
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from telegram import Update
+from telegram.ext import Application
+from app.config import (
+    TELEGRAM_BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    CLUSTER_WORKER_ID,
+    CLUSTER_SECRET,
+    CLUSTER_HANDOFF_TIMEOUT,
+    SHUTDOWN_DRAIN_TIMEOUT,
+)
 from app.bot import build_bot_app
+from app.http_client import start_client, close_client, pool_stats
+from app.cache import cache_stats
+from app.coalesce import ANALYSIS_FLIGHTS
+from app.resilience import resilience_stats
+from app.refine import refine_stats
+from app.prompt_assembly import usage_stats
+from app.json_extract import parse_stats
+from app.outbound import OUTBOX
+from app.admission import ADMISSION
+from app.state import SESSION_STORE, SESSION_EXPIRY
+from app.session import Session
+from app.hash_ring import HashRing, SECRET_HEADER
+from app.snapshot import SNAPSHOT_STATS, save_sessions, restore_sessions
+from app.metrics import REGISTRY
+from app.knowledge_base import get_kb, watch_knowledge_base
 
 api = FastAPI(title="AI LegalMind")
 
+# מה ש-Update.de_json זורק על עדכון במבנה שגוי (למשל {} או "message": 5)
+DECODE_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+
+# אפליקציית הבוט של התהליך הנוכחי (נוצרת ב-startup)
+bot_app: Optional[Application] = None
+
+# update_id אחרונים שהגיעו מהתהליך הקדמי: אצווה שנשלחה שוב (אחרי שגיאה
+# או timeout) לא מטופלת פעמיים
+_SEEN_LIMIT = 10000
+_seen_updates: "OrderedDict[int, None]" = OrderedDict()
+
+# יורד ל-False בתחילת הכיבוי - עדכונים חדשים נדחים ב-503 (טלגרם ישלח שוב)
+accepting_updates = True
+
 @api.get("/health")
 def health():
     return {"status": "ok"}
 
+@api.get("/stats")
+def stats():
+    return {
+        "http_pool": pool_stats(),
+        "analysis_cache": cache_stats(),
+        "coalescing": ANALYSIS_FLIGHTS.stats(),
+        "upstream": resilience_stats(),
+        "tokens": usage_stats(),
+        "parsing": parse_stats(),
+        "admission": ADMISSION.stats(),
+        "session_expiry": SESSION_EXPIRY.stats(),
+        "refinement": refine_stats(),
+        "outbound": OUTBOX.stats(),
+        "snapshot": SNAPSHOT_STATS,
+        "knowledge_base": {"version": get_kb().version, "source": get_kb().source},
+        "updates": (
+            bot_app.update_processor.stats()
+            if bot_app is not None and hasattr(bot_app.update_processor, "stats")
+            else None
+        ),
+    }
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """מטריקות בפורמט הטקסט של Prometheus"""
+    return PlainTextResponse(
+        REGISTRY.render(
+            gauges={"legalmind_sessions": await SESSION_STORE.size()},
+            stats=stats(),
+        ),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+@api.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    """קבלת עדכון מטלגרם והעברתו לתור העדכונים של הבוט"""
+    if bot_app is None or BOT_MODE != "webhook":
+        raise HTTPException(status_code=503, detail="webhook mode is not active")
+    if not accepting_updates:
+        raise HTTPException(status_code=503, detail="shutting down")
+
+    # בלי סוד אין דרך לאמת שהעדכון הגיע מטלגרם - לא מקבלים כלום
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    # השוואה כבתים: compare_digest על מחרוזות נכשל בתווים שאינם ASCII
+    if not WEBHOOK_SECRET or not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="invalid secret token")
+
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            raise ValueError("update must be a JSON object")
+        update = Update.de_json(data, bot_app.bot)
+    except DECODE_ERRORS:
+        raise HTTPException(status_code=400, detail="invalid update")
+
+    await bot_app.update_queue.put(update)
+    return {"ok": True}
+
+def _require_cluster(request: Request):
+    """נקודות הקצה הפנימיות של מצב cluster - רק ב-worker ורק מהתהליך הקדמי"""
+    if not CLUSTER_WORKER_ID:
+        raise HTTPException(status_code=404, detail="not a cluster worker")
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), CLUSTER_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="invalid cluster secret")
+
+@api.post("/cluster/updates")
+async def cluster_updates(request: Request):
+    """אצוות עדכונים גולמיים מהתהליך הקדמי, לפי סדר ההגעה"""
+    _require_cluster(request)
+    if bot_app is None or not accepting_updates:
+        raise HTTPException(status_code=503, detail="bot is not running")
+    batch = await request.json()
+    if not isinstance(batch, list):
+        raise HTTPException(status_code=400, detail="invalid batch")
+
+    # פענוח האצווה כולה לפני שמשהו נכנס לתור - עדכון פגום מדולג ולא מכשיל את השאר
+    updates = []
+    for data in batch:
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("update must be a JSON object")
+            update = Update.de_json(data, bot_app.bot)
+        except DECODE_ERRORS as e:
+            print(f"⚠️ עדכון פגום מהתהליך הקדמי דולג: {type(e).__name__}: {e}")
+            continue
+        if update.update_id in _seen_updates:
+            continue
+        _seen_updates[update.update_id] = None
+        if len(_seen_updates) > _SEEN_LIMIT:
+            _seen_updates.popitem(last=False)
+        updates.append(update)
+
+    for update in updates:
+        await bot_app.update_queue.put(update)
+    return {"ok": True, "accepted": len(updates)}
+
+async def _wait_drained():
+    """המתנה עד שכל העדכונים שכבר הגיעו טופלו"""
+    while bot_app.update_queue.qsize():
+        await asyncio.sleep(0.01)
+    # עדכון שיצא מהתור נכנס לתיבת המשתמש רק בסבב הבא של הלולאה
+    await asyncio.sleep(0.05)
+    await bot_app.update_processor.wait_idle()
+
+@api.post("/cluster/handoff")
+async def cluster_handoff(request: Request):
+    """מסירת הסשנים שלפי הטבעת החדשה שייכים ל-worker אחר"""
+    _require_cluster(request)
+    body = await request.json()
+    ring = HashRing(body["nodes"], body["vnodes"])
+    if bot_app is not None:
+        # התהליך הקדמי עצר את השליחה; הסשנים נמסרים אחרי שהעדכונים שבדרך טופלו
+        try:
+            await asyncio.wait_for(_wait_drained(), CLUSTER_HANDOFF_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("⚠️ מסירת סשנים לפני שכל העדכונים טופלו")
+    # הסשנים נשארים כאן עד האישור (/cluster/handoff/ack) שהבעלים החדש טען אותם
+    moved = await SESSION_STORE.handoff(lambda user_id: ring.node_for(user_id) == CLUSTER_WORKER_ID)
+    return {"sessions": {str(user_id): session.to_dict() for user_id, session in moved.items()}}
+
+@api.post("/cluster/handoff/ack")
+async def cluster_handoff_ack(request: Request):
+    """מחיקת הסשנים שהבעלים החדש כבר טען"""
+    _require_cluster(request)
+    user_ids = (await request.json())["user_ids"]
+    await SESSION_STORE.release(user_ids)
+    return {"ok": True, "released": len(user_ids)}
+
+@api.post("/cluster/sessions")
+async def cluster_sessions(request: Request):
+    """טעינת סשנים שנמסרו מ-worker אחר"""
+    _require_cluster(request)
+    sessions = (await request.json())["sessions"]
+    for user_id, data in sessions.items():
+        await SESSION_STORE.put(int(user_id), Session.from_dict(data))
+    return {"ok": True, "loaded": len(sessions)}
+
 @api.on_event("startup")
 async def startup():
+    global bot_app
+
+    # ב-worker של cluster העדכונים מגיעים רק מהתהליך הקדמי, דרך /cluster/updates
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET and not CLUSTER_WORKER_ID:
+        raise RuntimeError("WEBHOOK_SECRET חובה במצב webhook")
+
+    # לקוח HTTP משותף לכל קריאות DeepSeek
+    await start_client()
+
+    # הסשנים מהכיבוי הקודם - לפני שמתקבל העדכון הראשון
+    await restore_sessions(SESSION_STORE)
+
+    # תפוגת סשנים מתוזמנת
+    asyncio.create_task(SESSION_EXPIRY.run())
+
+    # טעינה מחדש של מאגר הידע כשהקובץ משתנה (בלי אתחול)
+    asyncio.create_task(watch_knowledge_base())
+
     if not TELEGRAM_BOT_TOKEN:
         print("⚠️ TELEGRAM_BOT_TOKEN غير موجود في .env")
         return
 
     bot_app = build_bot_app(TELEGRAM_BOT_TOKEN)
-
-    # تشغيل البوت polling داخل نفس العملية
     await bot_app.initialize()
     await bot_app.start()
+
+    if BOT_MODE == "webhook":
+        # רישום ה-webhook אצל טלגרם (פעולה אידמפוטנטית, בטוחה לכמה workers)
+        if WEBHOOK_URL:
+            await bot_app.bot.set_webhook(
+                url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+            )
+        print("✅ Telegram bot started (webhook).")
+        return
+
+    # تشغيل البوت polling داخل نفس العملية
     asyncio.create_task(bot_app.updater.start_polling())
     print("✅ Telegram bot started (polling).")
+
+@api.on_event("shutdown")
+async def shutdown():
+    """
+    כיבוי מסודר, לפי הסדר:
+    1. הפסקת קבלת עדכונים (polling נעצר, webhook מחזיר 503)
+    2. סיום העדכונים שבטיפול, עד SHUTDOWN_DRAIN_TIMEOUT
+    3. סגירת מאגר החיבורים
+    4. snapshot של הסשנים לדיסק (נטען ב-startup הבא)
+    """
+    global accepting_updates
+    accepting_updates = False
+
+    if bot_app is not None:
+        if bot_app.updater is not None and bot_app.updater.running:
+            await bot_app.updater.stop()
+        # stop מטפל בכל מה שכבר בתור וממתין ל-handlers שרצים
+        try:
+            await asyncio.wait_for(bot_app.stop(), SHUTDOWN_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            in_flight = getattr(bot_app.update_processor, "in_flight", "?")
+            print(f"⚠️ תם הזמן לסיום העדכונים - {in_flight} עדכונים לא הושלמו")
+        await bot_app.shutdown()
+
+    await close_client()
+    await save_sessions(SESSION_STORE)
@@ -0,0 +1,171 @@
+import math
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# גבולות הדליים בשניות: מתשובה מהמטמון ועד קריאה איטית למודל
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+# מפתחות בסטטיסטיקות שהם מונים עולים (השאר מיוצאים כ-gauge)
+COUNTER_KEYS = frozenset({
+    "requests", "prompt_tokens", "cached_prompt_tokens", "completion_tokens",
+    "estimated_prompt_tokens", "hits", "misses", "stores", "evictions",
+    "leaders", "coalesced_waiters", "calls", "attempts", "retries",
+    "retry_after_honoured", "hedges_fired", "hedge_wins", "deadline_exceeded",
+    "successes", "failures", "breaker_opened", "breaker_short_circuits",
+    "direct", "extracted", "failed", "admitted", "queued", "rejected",
+    "rate_limit_waits", "ticks", "expired_total", "requested", "deduped",
+    "batches", "dispatched", "refined", "sent", "split_replies", "retried",
+    "global_waits", "clients_created", "processed", "dropped", "busy_replies",
+})
+
+# שם התווית לרמת הקינון בכל חלק של /stats
+NESTED_LABELS = {"upstream": "endpoint", "tokens": "endpoint", "parsing": "mode"}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    היסטוגרמה בתהליך, בסגנון Prometheus
+
+    observe הוא bisect וחיבור בלבד - אין נעילות (לולאת asyncio אחת)
+    ואין הקצאות אחרי הפעם הראשונה לכל צירוף תוויות.
+    """
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # לכל צירוף תוויות: ספירה לכל דלי (האחרון הוא +Inf), סכום
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0]
+            self._series[label_values] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}"
+            labels = _labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """רישום ההיסטוגרמות של התהליך ויצוא בפורמט הטקסט של Prometheus"""
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Histogram:
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(name, help_text, label_names)
+        return self._histograms[name]
+
+    def render(self, gauges: Optional[Dict[str, float]] = None, stats: Optional[Dict[str, Any]] = None) -> str:
+        lines: List[str] = []
+        for histogram in self._histograms.values():
+            lines.extend(histogram.render())
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        if stats:
+            lines.extend(render_stats(stats))
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(section: str, data: Dict[str, Any], samples: Dict[str, List[str]], types: Dict[str, str]):
+    label = NESTED_LABELS.get(section)
+    for key, value in data.items():
+        if isinstance(value, dict) and label:
+            for field, inner in value.items():
+                _add_sample(section, field, inner, f'{{{label}="{_escape(key)}"}}', samples, types)
+        else:
+            _add_sample(section, key, value, "", samples, types)
+
+
+def _add_sample(
+    section: str,
+    field: str,
+    value: Any,
+    labels: str,
+    samples: Dict[str, List[str]],
+    types: Dict[str, str],
+):
+    # רק ערכים מספריים; מחרוזות (שם backend, מצב המפסק) ו-None מדולגים
+    if isinstance(value, bool):
+        value = int(value)
+    if not isinstance(value, (int, float)):
+        return
+    counter = field in COUNTER_KEYS or field.endswith("_total")
+    name = f"legalmind_{section}_{field}"
+    if counter and not name.endswith("_total"):
+        name += "_total"
+    types[name] = "counter" if counter else "gauge"
+    samples.setdefault(name, []).append(f"{name}{labels} {_number(value)}")
+
+
+def render_stats(stats: Dict[str, Any]) -> List[str]:
+    """
+    שיטוח כל הערכים המספריים של /stats למטריקות
+
+    לדוגמה analysis_cache.hits -> legalmind_analysis_cache_hits_total,
+    ו-upstream.analysis.calls -> legalmind_upstream_calls_total{endpoint="analysis"}.
+    """
+    samples: Dict[str, List[str]] = {}
+    types: Dict[str, str] = {}
+    for section, data in stats.items():
+        if isinstance(data, dict):
+            _flatten(section, data, samples, types)
+    lines: List[str] = []
+    for name, rows in samples.items():
+        lines.append(f"# TYPE {name} {types[name]}")
+        lines.extend(rows)
+    return lines
+
+
+REGISTRY = Registry()
+
+ANALYZE_LATENCY = REGISTRY.histogram(
+    "legalmind_analyze_text_seconds",
+    "analyze_text latency by outcome",
+    ("outcome",),
+)
+HANDLE_LATENCY = REGISTRY.histogram(
+    "legalmind_handle_text_seconds",
+    "handle_text end-to-end latency by conversation phase",
+    ("phase",),
+)
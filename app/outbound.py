@@ -0,0 +1,170 @@
+import asyncio
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Message
+from telegram.error import RetryAfter
+
+from app.config import (
+    SEND_GLOBAL_RATE,
+    SEND_GLOBAL_BURST,
+    SEND_CHAT_RATE,
+    SEND_CHAT_BURST,
+    SEND_MAX_RETRIES,
+)
+from app.ratelimit import TokenBucket
+
+# מגבלת האורך של הודעת טלגרם
+MAX_MESSAGE_LENGTH = 4096
+
+# מעבר למספר הזה נמחקים דליים של צ'אטים שכבר התמלאו מחדש
+_MAX_CHAT_BUCKETS = 10000
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    חלוקת הודעה ארוכה לחלקים של עד limit תווים
+
+    החלוקה לפי פסקאות; פסקה ארוכה מדי מחולקת לפי שורות, ושורה ארוכה
+    מדי נחתכת.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    # כל חלק עם המפריד שקדם לו בטקסט המקורי
+    pieces: List[Tuple[str, str]] = []
+    for paragraph in text.split("\n\n"):
+        separator = "\n\n"
+        for line in paragraph.split("\n") if len(paragraph) > limit else [paragraph]:
+            for i in range(0, max(len(line), 1), limit):
+                pieces.append((separator if i == 0 else "", line[i:i + limit]))
+            separator = "\n"
+
+    chunks: List[str] = []
+    current: Optional[str] = None
+    for separator, piece in pieces:
+        if current is not None and len(current) + len(separator) + len(piece) <= limit:
+            current += separator + piece
+        else:
+            if current is not None:
+                chunks.append(current)
+            current = piece
+    if current is not None:
+        chunks.append(current)
+    # טלגרם דוחה הודעה ריקה
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    wait = error.retry_after
+    if isinstance(wait, timedelta):
+        return wait.total_seconds()
+    return float(wait)
+
+
+class Outbox:
+    """
+    שליחת הודעות יוצאות לטלגרם
+
+    כל קריאה ל-API ממתינה לאסימון מהדלי הגלובלי ומהדלי של הצ'אט, כך
+    שפרץ של תשובות מחכה בתור במקום להפוך לשרשרת של 429. על RetryAfter
+    ממתינים את הזמן שטלגרם ביקש ומנסים שוב.
+    """
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        global_burst: int = SEND_GLOBAL_BURST,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: int = SEND_CHAT_BURST,
+        max_retries: int = SEND_MAX_RETRIES,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats: Dict[Any, TokenBucket] = {}
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.sent = 0
+        self.split = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._prune()
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        """מחיקת דליים מלאים - צ'אט שלא שלח לאחרונה מתחיל מחדש עם דלי מלא ממילא"""
+        for chat_id, bucket in list(self._chats.items()):
+            if bucket.is_full():
+                del self._chats[chat_id]
+
+    def forget(self, chat_ids: List[Any]):
+        """מחיקת הדליים של צ'אטים שהסשן שלהם פג (נרשם ב-SESSION_EXPIRY.on_expire)"""
+        for chat_id in chat_ids:
+            self._chats.pop(chat_id, None)
+
+    async def call(self, chat_id: Any, request: Callable[[], Awaitable[Any]]) -> Any:
+        """קריאה אחת ל-API של טלגרם בתוך מגבלות הקצב"""
+        for attempt in range(self.max_retries + 1):
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire()
+            finally:
+                self.waiting -= 1
+
+            try:
+                result = await request()
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                await asyncio.sleep(_retry_after_seconds(e))
+                continue
+            self.sent += 1
+            return result
+
+    async def reply(self, message: Message, text: str, **kwargs) -> Message:
+        """
+        תשובה להודעה, מחולקת לפי הצורך
+
+        Returns:
+            ההודעה האחרונה שנשלחה
+        """
+        chunks = split_message(text)
+        if len(chunks) > 1:
+            self.split += 1
+        sent = None
+        for chunk in chunks:
+            sent = await self.call(
+                message.chat_id, lambda chunk=chunk: message.reply_text(chunk, **kwargs)
+            )
+        return sent
+
+    async def edit(self, message: Message, text: str, **kwargs) -> Any:
+        """עריכת הודעה שנשלחה (נספרת במגבלות הקצב כמו שליחה)"""
+        return await self.call(message.chat_id, lambda: message.edit_text(text, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "sent": self.sent,
+            "split_replies": self.split,
+            "retried": self.retried,
+            "failed": self.failed,
+            "chats_tracked": len(self._chats),
+            "global_waits": self.global_bucket.waits,
+        }
+
+
+OUTBOX = Outbox()
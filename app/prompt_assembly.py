@@ -0,0 +1,175 @@
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+from app.config import PROMPT_USER_TOKEN_BUDGET, ANALYSIS_OUTPUT_MODE, DEEPSEEK_MODEL
+from app.prompts import SYSTEM_PROMPT_HE
+from app.schemas import Analysis
+
+# הודעת המערכת נבנית פעם אחת: אותם בתים בדיוק בכל בקשה,
+# כך שמטמון הקידומת בצד של DeepSeek פוגע בכל קריאה
+SYSTEM_MESSAGE: Dict[str, str] = {"role": "system", "content": SYSTEM_PROMPT_HE}
+
+# קירוב לטוקנייזר: משקל ממוצע לתו לפי סוג הכתב (מעוגל כלפי מעלה)
+_HEBREW = re.compile(r"[\u0590-\u05FF]")
+_LATIN = re.compile(r"[A-Za-z]")
+_DIGIT = re.compile(r"[0-9]")
+_SPACE = re.compile(r"\s")
+_HEBREW_WEIGHT = 0.5
+_LATIN_WEIGHT = 0.3
+_DIGIT_WEIGHT = 0.5
+_OTHER_WEIGHT = 1.0
+
+ELLIPSIS = "\n[...]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """הערכת מספר הטוקנים בטקסט בלי טוקנייזר אמיתי"""
+    if not text:
+        return 0
+    hebrew = len(_HEBREW.findall(text))
+    latin = len(_LATIN.findall(text))
+    digits = len(_DIGIT.findall(text))
+    spaces = len(_SPACE.findall(text))
+    other = len(text) - hebrew - latin - digits - spaces
+    return math.ceil(
+        hebrew * _HEBREW_WEIGHT
+        + latin * _LATIN_WEIGHT
+        + digits * _DIGIT_WEIGHT
+        + other * _OTHER_WEIGHT
+    )
+
+
+# הודעת המערכת קבועה - ההערכה שלה מחושבת פעם אחת
+SYSTEM_TOKENS = estimate_tokens(SYSTEM_MESSAGE["content"])
+
+
+def estimate_messages(messages: List[Dict[str, str]]) -> int:
+    """הערכת טוקני הפרומפט לבקשה שלמה"""
+    return sum(
+        SYSTEM_TOKENS if m is SYSTEM_MESSAGE else estimate_tokens(m["content"])
+        for m in messages
+    )
+
+
+def fit_to_budget(text: str, budget: int) -> str:
+    """
+    קיצור טקסט ארוך מהתקציב
+
+    נשמרים ההתחלה (שני שלישים) והסוף (שליש), כי שם בדרך כלל
+    מופיעים תיאור האירוע והבקשה עצמה.
+    """
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+
+    total = estimate_tokens(text)
+    keep = int(len(text) * max(budget - estimate_tokens(ELLIPSIS), 1) / total)
+    while True:
+        head = keep * 2 // 3
+        shortened = (
+            text[:head].rstrip() + ELLIPSIS + text[len(text) - (keep - head):].lstrip()
+        )
+        if keep == 0 or estimate_tokens(shortened) <= budget:
+            return shortened
+        keep = int(keep * 0.9)
+
+
+def build_messages(
+    user_text: str,
+    extra: str = "",
+    budget: int = PROMPT_USER_TOKEN_BUDGET
+) -> List[Dict[str, str]]:
+    """
+    הודעות הבקשה: הודעת המערכת הקבועה ואחריה תוכן המשתמש
+
+    רק תיאור הבעיה מקוצר; המידע שנאסף בשאלות ההמשך (extra) נשמר כמו שהוא.
+    """
+    if budget > 0:
+        # גם כשהמידע שנאסף ארוך, לתיאור הבעיה נשאר לפחות רבע מהתקציב
+        user_budget = max(budget - estimate_tokens(extra), budget // 4)
+        user_text = fit_to_budget(user_text, user_budget)
+    return [SYSTEM_MESSAGE, {"role": "user", "content": user_text + extra}]
+
+
+# פורמטים מובנים: השדות הנוספים לבקשה, נבנים פעם אחת (גם הם חלק מהקידומת)
+ANALYSIS_TOOL_NAME = "submit_analysis"
+OUTPUT_FORMATS: Dict[str, Dict[str, Any]] = {
+    "prompt": {},
+    "json_object": {"response_format": {"type": "json_object"}},
+    "tool": {
+        "tools": [{
+            "type": "function",
+            "function": {
+                "name": ANALYSIS_TOOL_NAME,
+                "description": "הגשת ניתוח התיק המשפטי",
+                "parameters": Analysis.model_json_schema(),
+            },
+        }],
+        "tool_choice": {"type": "function", "function": {"name": ANALYSIS_TOOL_NAME}},
+    },
+}
+
+# מודל החשיבה של DeepSeek אינו תומך ב-JSON mode ובקריאה לכלים
+_UNSTRUCTURED_MODELS = ("deepseek-reasoner",)
+
+
+def resolve_output_mode(mode: str = ANALYSIS_OUTPUT_MODE, model: str = DEEPSEEK_MODEL) -> str:
+    """מצב הפלט בפועל: מצב לא מוכר או מודל שלא תומך חוזרים ל-prompt"""
+    if mode not in OUTPUT_FORMATS:
+        print(f"⚠️ ANALYSIS_OUTPUT_MODE לא מוכר ({mode}), משתמש ב-prompt")
+        return "prompt"
+    if mode != "prompt" and model.startswith(_UNSTRUCTURED_MODELS):
+        print(f"⚠️ המודל {model} אינו תומך בפלט מובנה, משתמש ב-prompt")
+        return "prompt"
+    return mode
+
+
+OUTPUT_MODE = resolve_output_mode()
+
+
+class UsageMeter:
+    """צבירת שדות usage מתשובות DeepSeek לפי endpoint"""
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(
+        self,
+        endpoint: str,
+        usage: Optional[Dict[str, Any]],
+        estimated_prompt: int = 0
+    ):
+        if not usage:
+            return
+        totals = self._totals.setdefault(endpoint, {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "estimated_prompt_tokens": 0,
+        })
+        totals["requests"] += 1
+        totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        totals["cached_prompt_tokens"] += usage.get("prompt_cache_hit_tokens") or 0
+        totals["completion_tokens"] += usage.get("completion_tokens") or 0
+        totals["estimated_prompt_tokens"] += estimated_prompt
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for endpoint, totals in self._totals.items():
+            prompt = totals["prompt_tokens"]
+            result[endpoint] = {
+                **totals,
+                "cache_hit_ratio": round(totals["cached_prompt_tokens"] / prompt, 3) if prompt else 0.0,
+                # יחס ההערכה המקומית למספר האמיתי - לכיול המשקלים
+                "estimate_ratio": round(totals["estimated_prompt_tokens"] / prompt, 3) if prompt else 0.0,
+                "avg_completion_tokens": round(totals["completion_tokens"] / totals["requests"], 1),
+            }
+        return result
+
+
+TOKEN_USAGE = UsageMeter()
+
+
+def usage_stats() -> Dict[str, Any]:
+    """סטטיסטיקות הטוקנים עבור /stats"""
+    return TOKEN_USAGE.stats()
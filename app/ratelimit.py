@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    דלי אסימונים: קצב ממוצע rate לשנייה עם פרץ של עד burst
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.waits = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        ניסיון לקחת אסימונים
+
+        Returns:
+            0 אם נלקחו, אחרת מספר השניות שיש להמתין
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def is_full(self) -> bool:
+        """האם הדלי התמלא מחדש - כלומר לא נלקחו ממנו אסימונים לאחרונה"""
+        self._refill()
+        return self._tokens >= self.burst
+
+    async def acquire(self, tokens: float = 1.0):
+        """המתנה עד שיש מספיק אסימונים"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            self.waits += 1
+            await asyncio.sleep(wait)
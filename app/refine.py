@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.ai_service import refine_analysis
+from app.cache import make_key
+from app.config import REFINE_WINDOW, REFINE_MAX_BATCH
+from app.schemas import Analysis
+
+# בקשת חידוד אחת בחלון: משתמש, תיאור הבעיה, התשובות והתוצאה העתידית
+_Job = Tuple[Any, str, Dict[str, Any], "asyncio.Future[Optional[Analysis]]"]
+
+
+class Refiner:
+    """
+    ניתוח מחודש אחרי שאלות ההמשך, באצוות לפי חלון זמן
+
+    בקשות שמגיעות בתוך אותו חלון נאספות יחד: בקשות זהות (אותה בעיה ואותן
+    תשובות) מתאחדות לקריאה אחת, והשאר נשלחות יחד דרך בקרת הכניסה.
+    ל-DeepSeek אין endpoint של אצוות, ולכן האצווה נשלחת כקריאות מקבילות.
+    """
+    def __init__(self, window: float = REFINE_WINDOW, max_batch: int = REFINE_MAX_BATCH):
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending: Dict[str, _Job] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.requested = 0
+        self.deduped = 0
+        self.batches = 0
+        self.dispatched = 0
+        self.refined = 0
+        self.failed = 0
+        self.largest_batch = 0
+
+    async def refine(
+        self,
+        user_id: Any,
+        problem_text: str,
+        collected_info: Dict[str, Any]
+    ) -> Optional[Analysis]:
+        """ניתוח מחודש; None כשהחידוד נכשל או נדחה"""
+        self.requested += 1
+        key = make_key(problem_text, collected_info)
+
+        job = self._pending.get(key)
+        if job is not None:
+            self.deduped += 1
+            future = job[3]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = (user_id, problem_text, dict(collected_info), future)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    self.window, self._flush
+                )
+
+        # ביטול של ממתין אחד לא מבטל את החידוד לשאר הממתינים
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """שליחת כל הבקשות שנאספו בחלון הנוכחי"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch: List[_Job] = list(self._pending.values())
+        self._pending = {}
+        if not batch:
+            return
+
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for job in batch:
+            task = asyncio.ensure_future(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job):
+        user_id, problem_text, collected_info, future = job
+        result: Optional[Analysis] = None
+        try:
+            self.dispatched += 1
+            result = await refine_analysis(problem_text, collected_info, user_id)
+        except Exception as e:
+            print(f"שגיאה בניתוח מחודש: {type(e).__name__}: {e}")
+
+        if result is None:
+            self.failed += 1
+        else:
+            self.refined += 1
+        if not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requested": self.requested,
+            "deduped": self.deduped,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "dispatched": self.dispatched,
+            "refined": self.refined,
+            "failed": self.failed,
+            "pending": len(self._pending),
+        }
+
+
+REFINER = Refiner()
+
+
+def refine_stats() -> Dict[str, Any]:
+    """סטטיסטיקות החידוד עבור /stats"""
+    return REFINER.stats()
@@ -0,0 +1,267 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import httpx
+from app.config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    HEDGE_ENABLED,
+    HEDGE_MIN_SAMPLES,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    ENDPOINT_DEADLINES,
+    HTTP_TIMEOUT,
+)
+
+
+class CircuitOpenError(Exception):
+    """המפסק פתוח - השירות החיצוני מושבת ואין טעם לנסות"""
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """תקציב הזמן של נקודת הקצה נגמר (כולל כל הניסיונות)"""
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """429, 5xx, timeout ושגיאות תעבורה ראויים לניסיון חוזר"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """קריאת כותרת Retry-After (שניות או תאריך HTTP)"""
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """
+    חלון נע של זמני תגובה לחישוב אחוזונים (p50/p95/p99)
+    """
+    def __init__(self, size: int = 512):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    מפסק זרם: אחרי רצף כשלים נפתח ומכשיל מיד עד שחולף זמן האיפוס,
+    ואז מאפשר ניסיון בודק אחד (half-open)
+    """
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuits = 0
+        self._probe_in_flight = False
+
+    def allow(self):
+        """זורקת CircuitOpenError אם אסור לפנות כרגע"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.short_circuits += 1
+                raise CircuitOpenError("שירות הניתוח אינו זמין כרגע")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.short_circuits += 1
+                raise CircuitOpenError("שירות הניתוח אינו זמין כרגע")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self):
+        """שחרור ניסיון בודק שבוטל בלי תוצאה"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """
+    עטיפת קריאה חיצונית: מפסק, תקציב זמן, ניסיונות חוזרים עם jitter
+    ו-hedging אופציונלי לפי p95
+    """
+    def __init__(self, endpoint: str, hedge: bool = HEDGE_ENABLED):
+        self.endpoint = endpoint
+        self.deadline = ENDPOINT_DEADLINES.get(endpoint, HTTP_TIMEOUT)
+        self.hedge = hedge
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "retry_after_honoured": 0,
+            "hedges_fired": 0,
+            "hedge_wins": 0,
+            "deadline_exceeded": 0,
+            "successes": 0,
+            "failures": 0,
+        }
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            self.counters["retry_after_honoured"] += 1
+            return retry_after
+        # full jitter: אקראי בין 0 לגבול האקספוננציאלי
+        cap = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters["attempts"] += 1
+        started = time.monotonic()
+        result = await fn()
+        self.latency.observe(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """ניסיון ראשון, ואם הוא חורג מ-p95 - ניסיון שני במקביל; הראשון שמצליח מנצח"""
+        p95 = self.latency.percentile(0.95)
+        if not self.hedge or p95 is None or len(self.latency) < HEDGE_MIN_SAMPLES:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        pending = {primary}
+        # מכאן כל יציאה (כולל ביטול מה-deadline) מבטלת את הניסיונות שעוד רצים
+        try:
+            done, pending = await asyncio.wait(pending, timeout=p95)
+            if done:
+                return primary.result()
+
+            self.counters["hedges_fired"] += 1
+            hedge = asyncio.ensure_future(self._timed(fn))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], hedge: bool = True) -> Any:
+        """
+        הפעלת fn תחת מדיניות העמידות
+
+        Args:
+            fn: פונקציה שמבצעת ניסיון אחד (נקראת מחדש בכל ניסיון)
+            hedge: האם מותר לשכפל את הניסיון (לא בטוח ל-streaming)
+        """
+        self.counters["calls"] += 1
+        self.breaker.allow()
+        deadline = time.monotonic() + self.deadline
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                runner = self._hedged(fn) if hedge else self._timed(fn)
+                result = await asyncio.wait_for(runner, timeout=remaining)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except asyncio.TimeoutError:
+                self.counters["deadline_exceeded"] += 1
+                self.counters["failures"] += 1
+                self.breaker.record_failure()
+                raise DeadlineExceeded(
+                    f"תקציב הזמן של {self.endpoint} ({self.deadline}s) נגמר"
+                )
+            except Exception as e:
+                if not _is_retryable(e):
+                    # השירות ענה (למשל 400) - זו לא תקלת זמינות
+                    self.counters["failures"] += 1
+                    self.breaker.record_success()
+                    raise
+                attempt += 1
+                delay = self._backoff(attempt - 1, e)
+                if attempt >= RETRY_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                    self.counters["failures"] += 1
+                    self.breaker.record_failure()
+                    raise
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self.counters["successes"] += 1
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.counters)
+        stats["deadline_seconds"] = self.deadline
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.times_opened
+        stats["breaker_short_circuits"] = self.breaker.short_circuits
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = self.latency.percentile(q)
+            stats[f"latency_{name}"] = round(value, 4) if value is not None else None
+        return stats
+
+
+# עטיפה לכל נקודת קצה של DeepSeek
+UPSTREAM: Dict[str, ResilientCaller] = {
+    "analysis": ResilientCaller("analysis"),
+    "refine": ResilientCaller("refine"),
+}
+
+
+def resilience_stats() -> Dict[str, Any]:
+    """מונים לכל נקודות הקצה, לנקודת /stats"""
+    return {name: caller.stats() for name, caller in UPSTREAM.items()}
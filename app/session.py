@@ -1,31 +1,233 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+import sys
+import time
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, get_args
+from app.schemas import Analysis, Category
+from app.followups import get_followups_for_category
+
+
+class Phase(IntEnum):
+    """שלב השיחה (מחליף את הדגלים active / awaiting_problem)"""
+    INACTIVE = 0
+    AWAITING_PROBLEM = 1
+    IN_PROGRESS = 2
+    # התשובה הסופית נשלחה; הודעות נוספות מקבלות אותה שוב עד /end או /new
+    DONE = 3
+
+
+class Kind(IntEnum):
+    """סוג התשובה המצופה לשאלה הפתוחה"""
+    BOOL = 0
+    NUMBER = 1
+    TEXT = 2
+
+
+_KIND_NAMES = {kind: kind.name.lower() for kind in Kind}
+_KINDS_BY_NAME = {name: kind for kind, name in _KIND_NAMES.items()}
+
+# מרשם שמות השדות: כל שם נשמר פעם אחת, והסשן מחזיק רק מספר קטן
+SLOT_NAMES: List[str] = []
+SLOT_IDS: Dict[str, int] = {}
+
+# סשן בלי תשובות - תצוגה ריקה משותפת
+_NO_SLOTS: Mapping[str, str] = MappingProxyType({})
+
+
+def slot_id(name: str) -> int:
+    """מספר השדה במרשם (שדה לא מוכר נרשם בפעם הראשונה)"""
+    sid = SLOT_IDS.get(name)
+    if sid is None:
+        sid = len(SLOT_NAMES)
+        SLOT_NAMES.append(sys.intern(name))
+        SLOT_IDS[SLOT_NAMES[sid]] = sid
+    return sid
+
+
+def _register_catalogue():
+    """רישום כל השדות מקטלוג שאלות ההמשך מראש"""
+    for category in get_args(Category):
+        for item in get_followups_for_category(category):
+            slot_id(item["slot"])
+
+
+_register_catalogue()
+
 
 class Session:
     """
     מחלקה לניהול מצב סשן המשתמש
+
+    ייצוג קומפקטי: __slots__ במקום __dict__, זמן monotonic כ-float,
+    שדות כמספרים מול המרשם, ו-enum לשלב השיחה ולסוג התשובה.
     """
+    __slots__ = (
+        "phase",
+        "analysis",
+        "_slots",
+        "_pending_slot",
+        "_pending_kind",
+        "pending_question",
+        "cursor",
+        "problem_text",
+        "refined",
+        "provisional",
+        "last_activity",
+    )
+
     def __init__(self):
-        self.active: bool = False
-        self.awaiting_problem: bool = False
-        self.analysis: Optional[Any] = None
-        self.slots: Dict[str, str] = {}
-        self.pending_slot: Optional[str] = None
-        self.pending_kind: Optional[str] = None
+        self.phase: Phase = Phase.INACTIVE
+        self.analysis: Optional[Analysis] = None
+        self._slots: Optional[Dict[int, str]] = None
+        self._pending_slot: int = -1
+        self._pending_kind: int = -1
         self.pending_question: Optional[str] = None
-        self.last_activity: datetime = datetime.now()
+        # מיקום השאלה הנוכחית בשאלון המהודר של הקטגוריה
+        self.cursor: int = 0
+        # תיאור הבעיה המקורי - נשמר רק לניתוח מחודש או למסלול המהיר
+        self.problem_text: Optional[str] = None
+        self.refined: bool = False
+        # הניתוח הוא סיווג מקומי זמני שממתין לתוצאת המודל
+        self.provisional: bool = False
+        self.last_activity: float = time.monotonic()
+
+    # דגלי השלב - נשמרים לתאימות עם הקוד הקיים
+    @property
+    def active(self) -> bool:
+        return self.phase != Phase.INACTIVE
+
+    @active.setter
+    def active(self, value: bool):
+        if not value:
+            self.phase = Phase.INACTIVE
+        elif self.phase == Phase.INACTIVE:
+            self.phase = Phase.IN_PROGRESS
+
+    @property
+    def awaiting_problem(self) -> bool:
+        return self.phase == Phase.AWAITING_PROBLEM
+
+    @awaiting_problem.setter
+    def awaiting_problem(self, value: bool):
+        if value:
+            self.phase = Phase.AWAITING_PROBLEM
+        elif self.phase == Phase.AWAITING_PROBLEM:
+            self.phase = Phase.IN_PROGRESS
+
+    @property
+    def pending_slot(self) -> Optional[str]:
+        return SLOT_NAMES[self._pending_slot] if self._pending_slot >= 0 else None
+
+    @pending_slot.setter
+    def pending_slot(self, name: Optional[str]):
+        self._pending_slot = slot_id(name) if name else -1
+
+    @property
+    def pending_kind(self) -> Optional[str]:
+        return _KIND_NAMES[self._pending_kind] if self._pending_kind >= 0 else None
+
+    @pending_kind.setter
+    def pending_kind(self, name: Optional[str]):
+        self._pending_kind = _KINDS_BY_NAME[name] if name else -1
+
+    @property
+    def slots(self) -> Mapping[str, str]:
+        """
+        התשובות שנאספו לפי שם השדה, לקריאה בלבד
+
+        זו תצוגה שנבנית מחדש בכל גישה - כתיבה אליה הייתה הולכת לאיבוד
+        בשקט, ולכן היא נכשלת. שמירת תשובה: set_slot.
+        """
+        if not self._slots:
+            return _NO_SLOTS
+        return MappingProxyType({SLOT_NAMES[sid]: value for sid, value in self._slots.items()})
+
+    @slots.setter
+    def slots(self, values: Mapping[str, str]):
+        self._slots = None
+        for name, value in values.items():
+            self.set_slot(name, value)
+
+    def set_slot(self, name: str, value: str):
+        """שמירת תשובה לשדה"""
+        if self._slots is None:
+            self._slots = {}
+        self._slots[slot_id(name)] = value
+
+    def ask(self, step: Mapping[str, str], cursor: int):
+        """סימון השאלה שבמיקום cursor כשאלה הפתוחה"""
+        self.cursor = cursor
+        self.pending_slot = step["slot"]
+        self.pending_kind = step["kind"]
+        self.pending_question = step["q"]
+
+    def clear_pending(self):
+        """אין שאלה פתוחה"""
+        self._pending_slot = -1
+        self._pending_kind = -1
+        self.pending_question = None
+
+    def has_slot(self, name: str) -> bool:
+        sid = SLOT_IDS.get(name)
+        return bool(self._slots) and sid in self._slots
     
     def update_activity(self):
         """עדכון זמן פעילות אחרון"""
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()
     
     def reset(self):
         """איפוס הסשן"""
-        self.active = False
-        self.awaiting_problem = False
+        self.phase = Phase.INACTIVE
         self.analysis = None
-        self.slots = {}
-        self.pending_slot = None
-        self.pending_kind = None
+        self._slots = None
+        self._pending_slot = -1
+        self._pending_kind = -1
         self.pending_question = None
-        self.last_activity = datetime.now()
\ No newline at end of file
+        self.cursor = 0
+        self.problem_text = None
+        self.refined = False
+        self.provisional = False
+        self.last_activity = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """המרה למילון לצורך שמירה באחסון חיצוני"""
+        # זמן monotonic לא שורד אתחול - נשמר כזמן שעון קיר
+        wall_clock = time.time() - (time.monotonic() - self.last_activity)
+        return {
+            "active": self.active,
+            "awaiting_problem": self.awaiting_problem,
+            "done": self.phase == Phase.DONE,
+            "analysis": self.analysis.model_dump() if self.analysis else None,
+            "slots": dict(self.slots),
+            "pending_slot": self.pending_slot,
+            "pending_kind": self.pending_kind,
+            "pending_question": self.pending_question,
+            "cursor": self.cursor,
+            "problem_text": self.problem_text,
+            "refined": self.refined,
+            "provisional": self.provisional,
+            "last_activity": wall_clock,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        """שחזור סשן ממילון שנשמר ב-to_dict"""
+        session = cls()
+        session.active = data.get("active", False)
+        session.awaiting_problem = data.get("awaiting_problem", False)
+        if session.active and data.get("done"):
+            session.phase = Phase.DONE
+        if data.get("analysis"):
+            session.analysis = Analysis(**data["analysis"])
+        session.slots = data.get("slots") or {}
+        session.pending_slot = data.get("pending_slot")
+        session.pending_kind = data.get("pending_kind")
+        session.pending_question = data.get("pending_question")
+        session.cursor = data.get("cursor", 0)
+        session.problem_text = data.get("problem_text")
+        session.refined = data.get("refined", False)
+        session.provisional = data.get("provisional", False)
+        if data.get("last_activity") is not None:
+            age = max(0.0, time.time() - data["last_activity"])
+            session.last_activity = time.monotonic() - age
+        return session
@@ -0,0 +1,323 @@
+import asyncio
+import heapq
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from app.config import (
+    SESSION_STORE_BACKEND,
+    SESSION_SQLITE_PATH,
+    REDIS_URL,
+    SESSION_TTL,
+)
+from app.session import Session
+
+
+class SessionStore(ABC):
+    """
+    ממשק אחסון סשנים
+
+    ה-handlers של הבוט טוענים סשן ב-get, משנים אותו, ושומרים ב-put.
+    """
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[Session]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def put(self, user_id: int, session: Session):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, user_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def touch(self, user_id: int):
+        """עדכון זמן הפעילות האחרון בלי לשמור את כל הסשן"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def size(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expire(self) -> Tuple[List[int], int]:
+        """
+        מחיקת סשנים שפג תוקפם
+
+        Returns:
+            (מזהי המשתמשים שנמחקו, מספר הרשומות שנבדקו)
+        """
+        raise NotImplementedError
+
+    async def handoff(self, keep: Callable[[int], bool]) -> Dict[int, Session]:
+        """
+        הסשנים שאינם שייכים עוד לתהליך הזה (מצב cluster)
+
+        הסשנים לא נמחקים כאן - רק ב-release, אחרי שהבעלים החדש טען אותם.
+        אחסון משותף (SQLite / Redis) נגיש לכל ה-workers - אין מה להעביר.
+        """
+        return {}
+
+    async def release(self, user_ids: List[int]):
+        """מחיקת סשנים שנמסרו ב-handoff ונטענו אצל הבעלים החדש"""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    אחסון בזיכרון התהליך - ההתנהגות המקורית של SESSIONS
+
+    התפוגה מנוהלת בערימת מינימום של (מועד תפוגה, משתמש): כל סשן נכנס
+    לערימה פעם אחת, ובכל סבב נבדקות רק הרשומות שהגיע זמנן. סשן שהיה
+    פעיל בינתיים מתוזמן מחדש לפי last_activity העדכני.
+    """
+    def __init__(self, sessions: Optional[Dict[int, Session]] = None, ttl: float = SESSION_TTL):
+        self.sessions = sessions if sessions is not None else {}
+        self.ttl = ttl
+        self._deadlines: List[Tuple[float, int]] = []
+        self._scheduled = set()
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        return self.sessions.get(user_id)
+
+    async def put(self, user_id: int, session: Session):
+        self.sessions[user_id] = session
+        if user_id not in self._scheduled:
+            self._scheduled.add(user_id)
+            heapq.heappush(self._deadlines, (session.last_activity + self.ttl, user_id))
+
+    async def delete(self, user_id: int):
+        self.sessions.pop(user_id, None)
+
+    async def touch(self, user_id: int):
+        session = self.sessions.get(user_id)
+        if session is not None:
+            session.update_activity()
+
+    async def size(self) -> int:
+        return len(self.sessions)
+
+    async def expire(self) -> Tuple[List[int], int]:
+        now = time.monotonic()
+        expired: List[int] = []
+        examined = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, user_id = heapq.heappop(self._deadlines)
+            examined += 1
+            session = self.sessions.get(user_id)
+            if session is None:
+                self._scheduled.discard(user_id)
+                continue
+            due = session.last_activity + self.ttl
+            if due <= now:
+                del self.sessions[user_id]
+                self._scheduled.discard(user_id)
+                expired.append(user_id)
+            else:
+                heapq.heappush(self._deadlines, (due, user_id))
+        return expired, examined
+
+    async def handoff(self, keep: Callable[[int], bool]) -> Dict[int, Session]:
+        return {user_id: session for user_id, session in self.sessions.items() if not keep(user_id)}
+
+    async def release(self, user_ids: List[int]):
+        # הרשומות בערימה נשארות; expire מדלג על סשן שכבר לא קיים
+        for user_id in user_ids:
+            self.sessions.pop(user_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    אחסון עמיד ב-SQLite במצב WAL (שורד אתחול, משותף לתהליכים באותה מכונה)
+    """
+    def __init__(self, path: str = SESSION_SQLITE_PATH, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " last_activity REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_activity ON sessions (last_activity)"
+        )
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT data FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Session.from_dict(json.loads(row[0]))
+
+    async def put(self, user_id: int, session: Session):
+        data = session.to_dict()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (user_id, json.dumps(data, ensure_ascii=False), data["last_activity"]),
+        )
+
+    async def delete(self, user_id: int):
+        self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    async def touch(self, user_id: int):
+        row = self._conn.execute(
+            "SELECT data FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return
+        data = json.loads(row[0])
+        data["last_activity"] = time.time()
+        self._conn.execute(
+            "UPDATE sessions SET data = ?, last_activity = ? WHERE user_id = ?",
+            (json.dumps(data, ensure_ascii=False), data["last_activity"], user_id),
+        )
+
+    async def size(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def expire(self) -> Tuple[List[int], int]:
+        # האינדקס על last_activity מבטיח שנסרקות רק השורות שפג תוקפן
+        cutoff = time.time() - self.ttl
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = [
+                row[0] for row in self._conn.execute(
+                    "SELECT user_id FROM sessions WHERE last_activity < ?", (cutoff,)
+                )
+            ]
+            self._conn.execute("DELETE FROM sessions WHERE last_activity < ?", (cutoff,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return expired, len(expired)
+
+
+class RedisError(Exception):
+    """שגיאה שהוחזרה משרת Redis"""
+
+
+class RedisSessionStore(SessionStore):
+    """
+    אחסון משותף בשרת שמדבר בפרוטוקול Redis (RESP)
+
+    לקוח מינימלי מעל asyncio, בלי תלות חיצונית. תפוגת סשנים מנוהלת
+    על ידי השרת (EX), כך שסשן לא פעיל נמחק גם בלי ניקוי מצד הבוט.
+    """
+    def __init__(self, url: str = REDIS_URL, ttl: float = SESSION_TTL, prefix: str = "legalmind:session:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("החיבור ל-Redis נסגר")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"תשובה לא מוכרת מהשרת: {line!r}")
+
+    async def _send(self, *args) -> Any:
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _command(self, *args) -> Any:
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                if self.password:
+                    await self._send("AUTH", self.password)
+                if self.db:
+                    await self._send("SELECT", self.db)
+            try:
+                return await self._send(*args)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._writer.close()
+                self._writer = None
+                raise
+
+    async def get(self, user_id: int) -> Optional[Session]:
+        raw = await self._command("GET", self._key(user_id))
+        if raw is None:
+            return None
+        return Session.from_dict(json.loads(raw))
+
+    async def put(self, user_id: int, session: Session):
+        data = json.dumps(session.to_dict(), ensure_ascii=False)
+        await self._command("SET", self._key(user_id), data, "EX", self.ttl)
+
+    async def delete(self, user_id: int):
+        await self._command("DEL", self._key(user_id))
+
+    async def touch(self, user_id: int):
+        await self._command("EXPIRE", self._key(user_id), self.ttl)
+
+    async def size(self) -> int:
+        count = 0
+        cursor = b"0"
+        while True:
+            cursor, keys = await self._command("SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", 1000)
+            count += len(keys)
+            if cursor in (b"0", "0"):
+                return count
+
+    async def expire(self) -> Tuple[List[int], int]:
+        # השרת מוחק סשנים בעצמו לפי ה-TTL שנקבע ב-SET
+        return [], 0
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def build_session_store(
+    sessions: Dict[int, Session],
+    backend: str = SESSION_STORE_BACKEND,
+) -> SessionStore:
+    """יצירת אחסון הסשנים לפי ההגדרות"""
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    return MemorySessionStore(sessions)
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from app.config import SESSION_SNAPSHOT_PATH, SESSION_TTL, CLUSTER_WORKER_ID
+from app.session import Session
+from app.session_store import MemorySessionStore, SessionStore
+
+# גרסת הפורמט (שורת הכותרת של הקובץ)
+SNAPSHOT_VERSION = 1
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_DECODER = json.JSONDecoder()
+
+SNAPSHOT_STATS: Dict[str, Any] = {
+    "written": 0,
+    "write_ms": 0.0,
+    "restored": 0,
+    "skipped": 0,
+    "restore_ms": 0.0,
+}
+
+
+def snapshot_path(path: str = SESSION_SNAPSHOT_PATH) -> str:
+    """קובץ נפרד לכל worker במצב cluster (כל worker מחזיק רק את הסשנים שלו)"""
+    if path and CLUSTER_WORKER_ID:
+        return f"{path}.{CLUSTER_WORKER_ID}"
+    return path
+
+
+def _compact(user_id: int, session: Session) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"user_id": user_id}
+    # ערכי ברירת מחדל לא נשמרים - from_dict משלים אותם
+    for key, value in session.to_dict().items():
+        if value:
+            record[key] = value
+    return record
+
+
+def write_snapshot(sessions: Dict[int, Session], path: str) -> int:
+    """
+    כתיבת כל הסשנים לקובץ JSONL (סשן בשורה)
+
+    הכתיבה לקובץ זמני ואז החלפה אטומית - קריסה באמצע לא משאירה
+    snapshot חלקי.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"version": SNAPSHOT_VERSION, "written_at": time.time(), "count": len(sessions)}) + "\n")
+        for user_id, session in sessions.items():
+            f.write(_ENCODER.encode(_compact(user_id, session)))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(sessions)
+
+
+def read_snapshot(path: str, ttl: float = SESSION_TTL) -> Iterator[Tuple[int, Session]]:
+    """
+    קריאת snapshot שורה אחר שורה (בלי לטעון את כל הקובץ לזיכרון)
+
+    סשנים שפג תוקפם בזמן שהתהליך היה למטה ושורות פגומות מדולגים.
+    """
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("version") != SNAPSHOT_VERSION:
+            print(f"⚠️ גרסת snapshot לא נתמכת: {header.get('version')}")
+            return
+        now = time.monotonic()
+        for line in f:
+            try:
+                data = _DECODER.decode(line)
+                user_id = int(data.pop("user_id"))
+                session = Session.from_dict(data)
+            except (ValueError, KeyError, TypeError) as e:
+                SNAPSHOT_STATS["skipped"] += 1
+                print(f"⚠️ שורה פגומה ב-snapshot: {e}")
+                continue
+            if now - session.last_activity > ttl:
+                SNAPSHOT_STATS["skipped"] += 1
+                continue
+            yield user_id, session
+
+
+async def save_sessions(store: SessionStore, path: Optional[str] = None) -> int:
+    """
+    snapshot של הסשנים בזיכרון (בכיבוי)
+
+    SQLite ו-Redis עמידים ממילא - אין מה לשמור.
+    """
+    path = snapshot_path() if path is None else path
+    if not path or not isinstance(store, MemorySessionStore):
+        return 0
+    started = time.perf_counter()
+    count = write_snapshot(store.sessions, path)
+    SNAPSHOT_STATS["written"] = count
+    SNAPSHOT_STATS["write_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    print(f"💾 נשמרו {count} סשנים ל-{path} ({SNAPSHOT_STATS['write_ms']:.0f}ms)")
+    return count
+
+
+async def restore_sessions(store: SessionStore, path: Optional[str] = None) -> int:
+    """
+    טעינת ה-snapshot שנכתב בכיבוי הקודם (באתחול)
+
+    הקובץ נמחק אחרי הטעינה, כדי שקריסה מאוחרת יותר לא תחזיר מצב ישן.
+    """
+    path = snapshot_path() if path is None else path
+    if not path or not isinstance(store, MemorySessionStore) or not os.path.exists(path):
+        return 0
+    started = time.perf_counter()
+    count = 0
+    for user_id, session in read_snapshot(path):
+        await store.put(user_id, session)
+        count += 1
+    os.remove(path)
+    SNAPSHOT_STATS["restored"] = count
+    SNAPSHOT_STATS["restore_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    print(f"♻️ שוחזרו {count} סשנים מ-{path} ({SNAPSHOT_STATS['restore_ms']:.0f}ms)")
+    return count
@@ -1,4 +1,12 @@
 from typing import Dict
 from app.session import Session
+from app.session_store import SessionStore, build_session_store
+from app.expiry import SessionExpiry
 
 SESSIONS: Dict[int, Session] = {}
+
+# כל הגישה לסשנים עוברת דרך האחסון; במצב memory הוא עוטף את SESSIONS
+SESSION_STORE: SessionStore = build_session_store(SESSIONS)
+
+# תפוגת סשנים מתוזמנת (מופעלת מ-main.startup)
+SESSION_EXPIRY = SessionExpiry(SESSION_STORE)
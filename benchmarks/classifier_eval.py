@@ -0,0 +1,93 @@
+"""
+הערכת הסיווג המקומי מול תוויות המודל
+
+קובץ הדוגמאות הוא JSONL עם text ו-category, כאשר category הוא הסיווג
+של המודל לאותו טקסט. הקובץ המצורף תויג ידנית; לתיוג מחדש מול המודל
+(דורש DEEPSEEK_API_KEY):
+    python -m benchmarks.classifier_eval --label
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.classifier_eval [--samples PATH] [--threshold 0.65]
+"""
+import argparse
+import asyncio
+import json
+import os
+import timeit
+from collections import Counter
+
+from app.classifier import predict
+from app.config import CLASSIFIER_THRESHOLD
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "classifier_samples.jsonl")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def label(path):
+    """תיוג מחדש של כל הדוגמאות בעזרת המודל"""
+    from app.ai_service import analyze_text
+    from app.http_client import close_client
+
+    samples = load(path)
+    try:
+        for sample in samples:
+            sample["category"] = (await analyze_text(sample["text"])).category
+    finally:
+        await close_client()
+    with open(path, "w", encoding="utf-8") as f:
+        for sample in samples:
+            f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+    print(f"תויגו {len(samples)} דוגמאות")
+
+
+def evaluate(samples, threshold):
+    predictions = [(s["category"], *predict(s["text"])) for s in samples]
+
+    covered = [(llm, local) for llm, local, conf in predictions if local != "אחר" and conf >= threshold]
+    agree = sum(1 for llm, local in covered if llm == local)
+    overall = sum(1 for llm, local, _ in predictions if llm == local)
+
+    print(f"דוגמאות:              {len(samples)}")
+    print(f"כיסוי (מסלול מהיר):   {len(covered)}/{len(samples)} ({len(covered) / len(samples):.0%})")
+    if covered:
+        print(f"הסכמה בכיסוי:         {agree}/{len(covered)} ({agree / len(covered):.0%})")
+    print(f"הסכמה כוללת (ללא סף): {overall}/{len(samples)} ({overall / len(samples):.0%})")
+
+    print("\nטעויות בכיסוי (מודל -> מקומי):")
+    mistakes = Counter((llm, local) for llm, local in covered if llm != local)
+    for (llm, local), count in mistakes.most_common():
+        print(f"  {llm} -> {local}: {count}")
+    if not mistakes:
+        print("  אין")
+
+    print("\nסף  כיסוי  הסכמה")
+    for sweep in (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9):
+        hits = [(llm, local) for llm, local, conf in predictions if local != "אחר" and conf >= sweep]
+        ok = sum(1 for llm, local in hits if llm == local)
+        rate = f"{ok / len(hits):.0%}" if hits else "-"
+        print(f"{sweep:<4} {len(hits) / len(samples):>5.0%}  {rate:>5}")
+
+    text = samples[0]["text"]
+    runs, _ = timeit.Timer(lambda: predict(text)).autorange()
+    best = min(timeit.Timer(lambda: predict(text)).repeat(repeat=5, number=runs)) / runs
+    print(f"\npredict: {best * 1e6:.2f} µs/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", default=SAMPLES)
+    parser.add_argument("--threshold", type=float, default=CLASSIFIER_THRESHOLD)
+    parser.add_argument("--label", action="store_true", help="תיוג הדוגמאות מחדש מול המודל")
+    args = parser.parse_args()
+
+    if args.label:
+        asyncio.run(label(args.samples))
+    evaluate(load(args.samples), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+שרתים מקומיים שמחליפים את ה-API של טלגרם ושל DeepSeek במבחני עומס
+
+שני השרתים רצים באפליקציית FastAPI אחת, ב-thread נפרד עם לולאת asyncio
+משלו, כדי שעבודת השרת המדומה לא תיספר בלולאה של הבוט.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+# קולבק להודעה שהבוט שלח: (chat_id, method, text)
+OnMessage = Callable[[int, str, str], None]
+
+QUIRKS = ("fence", "prose", "trailing_comma", "smart_quotes", "gershayim")
+
+
+@dataclass
+class DeepSeekProfile:
+    """התנהגות ה-DeepSeek המדומה"""
+    latency_ms: float = 800.0
+    distribution: str = "lognormal"   # fixed / uniform / lognormal
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    quirk_rate: float = 0.0
+    # טקסט בעיה -> קטגוריה (ברירת מחדל: "אחר")
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    def latency(self, rng: random.Random) -> float:
+        mean = self.latency_ms / 1000
+        if self.distribution == "fixed":
+            return mean
+        if self.distribution == "uniform":
+            return rng.uniform(0, 2 * mean)
+        # lognormal שהממוצע שלו הוא mean
+        return rng.lognormvariate(0, self.sigma) * mean / math.exp(self.sigma ** 2 / 2)
+
+
+@dataclass
+class FakeCounters:
+    deepseek_calls: int = 0
+    deepseek_errors: int = 0
+    deepseek_quirks: int = 0
+    telegram_calls: int = 0
+    by_method: Dict[str, int] = field(default_factory=dict)
+
+
+def _analysis_text(category: str, quirk: Optional[str]) -> str:
+    summary = 'השוכר דורש החזר של 5,000 ש"ח {כולל הוצאות}'
+    body = json.dumps({
+        "category": category,
+        "complexity": "בינונית",
+        "summary": summary,
+        "missing_info": ["תאריך האירוע", "מסמכים רלוונטיים"],
+        "confidence": 0.8,
+    }, ensure_ascii=False)
+    if quirk == "fence":
+        return f"```json\n{body}\n```"
+    if quirk == "prose":
+        return f"להלן הניתוח המבוקש:\n{body}\nבהצלחה!"
+    if quirk == "trailing_comma":
+        return body[:-1] + ",}"
+    if quirk == "smart_quotes":
+        return body.replace('"category"', "“category”")
+    if quirk == "gershayim":
+        return body.replace('ש\\"ח', 'ש"ח')
+    return body
+
+
+def build_fake_api(profile: DeepSeekProfile, on_message: OnMessage, seed: int = 0):
+    """אפליקציה אחת עם נקודות הקצה של טלגרם ושל DeepSeek"""
+    app = FastAPI()
+    rng = random.Random(seed)
+    counters = FakeCounters()
+    message_ids = iter(range(1, 1 << 62))
+
+    @app.post("/bot{token}/{method}")
+    async def telegram(token: str, method: str, request: Request):
+        counters.telegram_calls += 1
+        counters.by_method[method] = counters.by_method.get(method, 0) + 1
+        body = (await request.body()).decode()
+        if "json" in request.headers.get("content-type", "") and body:
+            form = json.loads(body)
+        else:
+            form = dict(parse_qsl(body))
+
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(form["chat_id"])
+            on_message(chat_id, method, form.get("text", ""))
+            return {"ok": True, "result": {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": form.get("text", ""),
+            }}
+        return {"ok": True, "result": True}
+
+    @app.post("/v1/chat/completions")
+    async def deepseek(request: Request):
+        counters.deepseek_calls += 1
+        payload = await request.json()
+        await asyncio.sleep(profile.latency(rng))
+
+        if rng.random() < profile.error_rate:
+            counters.deepseek_errors += 1
+            status = rng.choice((429, 500, 503))
+            headers = {"Retry-After": "0.2"} if status == 429 else {}
+            return JSONResponse({"error": {"message": "fake error"}}, status_code=status, headers=headers)
+
+        problem = payload["messages"][-1]["content"].split("\n\nמידע נוסף שנאסף:")[0]
+        quirk = rng.choice(QUIRKS) if rng.random() < profile.quirk_rate else None
+        if quirk:
+            counters.deepseek_quirks += 1
+        content = _analysis_text(profile.labels.get(problem, "אחר"), quirk)
+        usage = {
+            "prompt_tokens": 700,
+            "prompt_cache_hit_tokens": 640,
+            "prompt_cache_miss_tokens": 60,
+            "completion_tokens": 90,
+        }
+
+        tool = bool(payload.get("tools"))
+        if payload.get("stream"):
+            async def events():
+                for i in range(0, len(content), 16):
+                    piece = content[i:i + 16]
+                    delta = (
+                        {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+                        if tool else {"content": piece}
+                    )
+                    yield f"data: {json.dumps({'choices': [{'delta': delta}]}, ensure_ascii=False)}\n\n"
+                yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        message = (
+            {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_0", "type": "function",
+                "function": {"name": "submit_analysis", "arguments": content},
+            }]}
+            if tool else {"role": "assistant", "content": content}
+        )
+        return {"choices": [{"index": 0, "message": message}], "usage": usage}
+
+    @app.get("/health")
+    async def health():
+        return PlainTextResponse("ok")
+
+    return app, counters
+
+
+class FakeServer:
+    """הרצת האפליקציה המדומה ב-thread נפרד"""
+    def __init__(self, app: FastAPI, port: int):
+        self.port = port
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self, timeout: float = 10.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("השרת המדומה לא עלה בזמן")
+            time.sleep(0.05)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
@@ -0,0 +1,55 @@
+"""
+מדידת עלות בניית תשובה ב-rules.format_reply, לפני ואחרי
+
+"לפני" הוא המימוש הקודם (benchmarks/legacy_rules.py): טבלת ההמלצות
+נבנית בכל קריאה והתשובה מורכבת ב-+=. "אחרי" הוא app.rules, שבו החלקים
+הקבועים מוכנים מראש במאגר הידע. לפני המדידה נבדק ששני המימושים מחזירים
+בדיוק את אותו טקסט.
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.format_reply
+"""
+import sys
+import timeit
+
+from app import rules
+from app.schemas import Analysis
+from benchmarks import legacy_rules
+
+ANALYSIS = Analysis(
+    category="שכירות",
+    complexity="בינונית",
+    summary="השוכר מבקש את החזר הפיקדון בסך 10,000 ₪ ובעל הבית מסרב בטענה לנזקים בדירה.",
+    missing_info=["פרוטוקול מסירה", "תמונות מצב הדירה", "חוזה השכירות"],
+    confidence=0.82,
+)
+
+
+def cases(module):
+    return {
+        "format_reply": lambda: module.format_reply(ANALYSIS),
+        "format_reply+resources": lambda: module.format_reply(ANALYSIS, include_resources=True),
+        "get_recommendation": lambda: module.get_recommendation(ANALYSIS),
+    }
+
+
+def best_time(fn) -> float:
+    runs, _ = timeit.Timer(fn).autorange()
+    return min(timeit.Timer(fn).repeat(repeat=5, number=runs)) / runs
+
+
+def main():
+    before, after = cases(legacy_rules), cases(rules)
+    mismatched = [name for name in before if before[name]() != after[name]()]
+    if mismatched:
+        print(f"המימושים מחזירים טקסט שונה: {', '.join(mismatched)}")
+        sys.exit(1)
+
+    print(f"{'case':<26}{'before':>12}{'after':>12}{'speedup':>10}")
+    for name in before:
+        t_before, t_after = best_time(before[name]), best_time(after[name])
+        print(f"{name:<26}{t_before * 1e6:>9.2f} µs{t_after * 1e6:>9.2f} µs{t_before / t_after:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+פאזינג ומדידת זמן לחילוץ ה-JSON מתשובת המודל
+
+1. קלטים עוינים בגדלים עולים - הזמן צריך לגדול ליניארית
+   (לשם השוואה נמדד גם החילוץ הקודם עם שלושת הביטויים הרגולריים)
+2. פאזינג: מוטציות אקראיות של תשובות תקינות - כל קלט מסתיים
+   ב-Analysis או ב-ValueError, בזמן חסום
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.json_extract [--seed 1] [--cases 5000]
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.json_extract import parse_analysis
+
+VALID = json.dumps({
+    "category": "שכירות",
+    "complexity": "בינונית",
+    "summary": "השוכר מבקש החזר פיקדון של 10,000 ש\"ח {כולל ריבית}",
+    "missing_info": ["פרוטוקול מסירה", "חוזה השכירות"],
+    "confidence": 0.82,
+}, ensure_ascii=False)
+
+ADVERSARIAL = {
+    "unclosed": lambda n: "{" * n,
+    "closers": lambda n: "}" * n,
+    "nested-unclosed": lambda n: "{ {" + '{"a": 1} ' * (n // 9),
+    "brace-pairs": lambda n: "{}" * (n // 2),
+    "quotes": lambda n: '{"' * (n // 2),
+    "prose+json": lambda n: "א" * n + VALID,
+    "nested-deep": lambda n: '{"a":' * (n // 5) + "1" + "}" * (n // 5),
+}
+
+# זמן מקסימלי לתו בפאזינג (מרווח נדיב מעל הממוצע הליניארי)
+MAX_SECONDS_PER_KB = 0.01
+
+
+def legacy_extract(text: str) -> dict:
+    """החילוץ הקודם (שלושה ביטויים רגולריים) - להשוואה בלבד"""
+    match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    cleaned = re.sub(r'[\n\r\t]', ' ', text)
+    match = re.search(r'\{.*\}', cleaned)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    raise ValueError("no json")
+
+
+def timed(fn, text):
+    started = time.perf_counter()
+    try:
+        fn(text)
+    except (ValueError, RecursionError):
+        pass
+    return time.perf_counter() - started
+
+
+def scaling():
+    sizes = (1_000, 4_000, 16_000, 64_000)
+    print(f"{'input':<16}" + "".join(f"{n:>12,}" for n in sizes))
+    for name, make in ADVERSARIAL.items():
+        row = [timed(parse_analysis, make(n)) for n in sizes]
+        print(f"{name:<16}" + "".join(f"{t * 1e3:>10.2f}ms" for t in row))
+        # החילוץ הקודם עד 16K בלבד - מעבר לזה הוא עלול לרוץ דקות
+        legacy = [timed(legacy_extract, make(n)) for n in sizes[:3]]
+        print(f"{'  legacy':<16}" + "".join(f"{t * 1e3:>10.2f}ms" for t in legacy))
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        op = rng.random()
+        pos = rng.randrange(len(chars) + 1)
+        if op < 0.4:
+            chars.insert(pos, rng.choice('{}[]",:\\“”' + "א ab"))
+        elif op < 0.7 and chars:
+            del chars[min(pos, len(chars) - 1)]
+        elif op < 0.85:
+            chars[pos:pos] = list(rng.choice(["```json\n", "\n```", "הנה התשובה: ", ",", "{" * 50]))
+        else:
+            chars = chars[:pos]
+    return "".join(chars)
+
+
+def fuzz(seed: int, cases: int):
+    rng = random.Random(seed)
+    parsed = failed = 0
+    worst = 0.0
+    for _ in range(cases):
+        text = mutate(rng, VALID) * rng.choice((1, 1, 1, 20))
+        started = time.perf_counter()
+        try:
+            parse_analysis(text)
+            parsed += 1
+        except ValueError:
+            failed += 1
+        elapsed = time.perf_counter() - started
+        worst = max(worst, elapsed / max(len(text) / 1000, 1))
+        assert elapsed <= MAX_SECONDS_PER_KB * max(len(text) / 1000, 1), (
+            f"חריגה מהזמן ({elapsed * 1e3:.1f}ms) עבור קלט באורך {len(text)}"
+        )
+    print(f"\nפאזינג: {cases} קלטים, {parsed} פוענחו, {failed} נדחו (ValueError)")
+    print(f"הזמן הגרוע ביותר: {worst * 1e3:.3f}ms ל-1K תווים")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cases", type=int, default=5000)
+    args = parser.parse_args()
+    scaling()
+    fuzz(args.seed, args.cases)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+מבחן עומס מקצה לקצה: אלפי משתמשים מדומים מול build_bot_app
+
+כל משתמש עובר /new -> תיאור בעיה -> כל שאלות ההמשך -> /end. העדכונים
+נכנסים לתור העדכונים של הבוט (כמו ב-webhook), והתשובות נאספות בשרת
+טלגרם מדומה. ה-DeepSeek המדומה מאפשר לקבוע התפלגות השהיה, שיעור
+שגיאות ו"פגמים" בפלט ה-JSON.
+
+כברירת מחדל מגבלות הקצב של הבוט (מכסת LLM, הגבלת שליחה לטלגרם) מוגדלות,
+כדי למדוד את הבוט עצמו; אפשר לדרוס אותן במשתני סביבה.
+
+עם --cluster N הבוט רץ כ-python -m app.cluster עם N workers, והעדכונים
+נשלחים ל-webhook של התהליך הקדמי - להשוואת תפוקה מול מספר הליבות.
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.loadtest --users 2000 --concurrency 200
+    python -m benchmarks.loadtest --users 2000 --cluster 4
+    python -m benchmarks.loadtest --latency-ms 1500 --error-rate 0.05 --quirk-rate 0.2
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DEFAULT_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123:loadtest",
+    "DEEPSEEK_API_KEY": "loadtest",
+    "BOT_MODE": "webhook",
+    "WEBHOOK_SECRET": "loadtest",
+    "LLM_MAX_CONCURRENCY": "256",
+    "LLM_RATE_PER_SEC": "0",
+    "LLM_MAX_QUEUE": "100000",
+    "SEND_GLOBAL_RATE": "0",
+    "SEND_CHAT_RATE": "0",
+    "KB_RELOAD_INTERVAL": "0",
+}
+
+PHASES = ("new", "problem", "answer", "final", "end")
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "classifier_samples.jsonl")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb() -> float:
+    """שיא ה-RSS של התהליך במגה-בייט"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="משתמשים פעילים בו-זמנית")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="זמן בין הודעות של אותו משתמש")
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quirk-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="המתנה מקסימלית לתשובה")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--cluster", type=int, default=0, help="מספר workers (0 = תהליך אחד)")
+    parser.add_argument("--cluster-port", type=int, default=8790)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault("TELEGRAM_BASE_URL", f"http://127.0.0.1:{args.port}/bot")
+    os.environ.setdefault("DEEPSEEK_URL", f"http://127.0.0.1:{args.port}/v1/chat/completions")
+
+    import asyncio
+    asyncio.run(run(args))
+
+
+async def start_cluster(args):
+    """הפעלת python -m app.cluster והמתנה עד שכל ה-workers בטבעת"""
+    import asyncio
+    import httpx
+    env = dict(os.environ, CLUSTER_WORKERS=str(args.cluster), CLUSTER_PORT=str(args.cluster_port))
+    cluster = subprocess.Popen([sys.executable, "-m", "app.cluster"], env=env)
+    front = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.cluster_port}", timeout=args.timeout)
+    while True:
+        if cluster.poll() is not None:
+            raise RuntimeError("app.cluster יצא לפני שעלה")
+        try:
+            if (await front.get("/health")).json()["workers"] == args.cluster:
+                return cluster, front
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+
+
+async def run(args):
+    import asyncio
+    # ההגדרות נקראות בזמן import - רק אחרי שמשתני הסביבה נקבעו
+    from telegram import Update
+    from app.bot import build_bot_app
+    from app.config import TELEGRAM_BOT_TOKEN, WEBHOOK_PATH, WEBHOOK_SECRET
+    from app.http_client import start_client, close_client
+    from app.knowledge_base import get_kb
+    from app.state import SESSIONS
+    from benchmarks.fakes import DeepSeekProfile, FakeServer, build_fake_api
+
+    with open(SAMPLES, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    labels = {sample["text"]: sample["category"] for sample in samples}
+
+    # סוג התשובה לכל שאלה, מכל השאלונים במאגר הידע
+    kinds: Dict[str, str] = {}
+    for steps in get_kb().followups.values():
+        for step in steps:
+            kinds[step["q"]] = step["kind"]
+    answers = {"bool": "כן", "number": "5000", "text": "לפני חודשיים"}
+
+    loop = asyncio.get_running_loop()
+    inboxes: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+
+    def on_message(chat_id: int, method: str, text: str):
+        # נקרא מה-thread של השרת המדומה
+        loop.call_soon_threadsafe(inboxes[chat_id].put_nowait, (method, text))
+
+    profile = DeepSeekProfile(
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        quirk_rate=args.quirk_rate,
+        labels=labels,
+    )
+    fake_app, counters = build_fake_api(profile, on_message, seed=args.seed)
+    server = FakeServer(fake_app, args.port)
+    server.start()
+
+    if args.cluster:
+        cluster, front = await start_cluster(args)
+    else:
+        await start_client()
+        bot_app = build_bot_app(TELEGRAM_BOT_TOKEN)
+        await bot_app.initialize()
+        await bot_app.start()
+
+    latencies: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    outcome = {"completed": 0, "failed": 0}
+    update_ids = iter(range(1, 1 << 62))
+    rng = random.Random(args.seed)
+
+    async def send(user_id: int, text: str):
+        message = {
+            "message_id": next(update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        data = {"update_id": message["message_id"], "message": message}
+        if args.cluster:
+            response = await front.post(
+                WEBHOOK_PATH, json=data, headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+            )
+            response.raise_for_status()
+        else:
+            await bot_app.update_queue.put(Update.de_json(data, bot_app.bot))
+
+    async def expect(user_id: int, done) -> str:
+        """המתנה להודעה מהבוט שעונה על התנאי (הודעות ביניים מדולגות)"""
+        inbox = inboxes[user_id]
+        while True:
+            method, text = await asyncio.wait_for(inbox.get(), args.timeout)
+            if method == "sendMessage" and done(text):
+                return text
+
+    async def step(user_id: int, phase: str, text: str, done, record: bool = True) -> Tuple[str, float]:
+        started = time.perf_counter()
+        await send(user_id, text)
+        reply = await expect(user_id, done)
+        elapsed = time.perf_counter() - started
+        if record:
+            latencies[phase].append(elapsed)
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000)
+        return reply, elapsed
+
+    def is_question(text: str) -> bool:
+        return not text.startswith("מנתח את הבעיה")
+
+    async def conversation(user_id: int):
+        sample = rng.choice(samples)
+        try:
+            await step(user_id, "new", "/new", lambda t: True)
+            reply, _ = await step(user_id, "problem", sample["text"], is_question)
+            # ההשהיה של התשובה הקודמת של המשתמש הזה; נרשמת רק כשברור שאינה האחרונה
+            previous = None
+            while "לסיום התיק: /end" not in reply:
+                question = next((q for q in kinds if q in reply), None)
+                if question is None:
+                    raise RuntimeError(f"תשובה לא צפויה: {reply[:80]}")
+                if previous is not None:
+                    latencies["answer"].append(previous)
+                reply, previous = await step(
+                    user_id, "answer", answers[kinds[question]], lambda t: True, record=False
+                )
+            # התשובה האחרונה היא התשובה הסופית - נמדדת בנפרד
+            # (בשאלון בלי שאלות אין תשובה סופית נפרדת)
+            if previous is not None:
+                latencies["final"].append(previous)
+            await step(user_id, "end", "/end", lambda t: "לתיק חדש: /new" in t)
+            outcome["completed"] += 1
+        except (asyncio.TimeoutError, RuntimeError) as e:
+            outcome["failed"] += 1
+            print(f"משתמש {user_id} נכשל: {type(e).__name__} {e}")
+
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def user(user_id: int):
+        async with gate:
+            await conversation(user_id)
+
+    rss_before = rss_mb()
+    sessions_before = len(SESSIONS)
+    started = time.perf_counter()
+    await asyncio.gather(*(user(1000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    if args.cluster:
+        front_stats = (await front.get("/stats")).json()
+        await front.aclose()
+        cluster.terminate()
+        cluster.wait(30)
+    else:
+        await bot_app.stop()
+        await bot_app.shutdown()
+        await close_client()
+    server.stop()
+
+    completed = outcome["completed"]
+    messages = sum(len(values) for values in latencies.values())
+    print(f"\nמשתמשים: {args.users} (במקביל: {args.concurrency}), "
+          f"השהיית DeepSeek: {args.latency_ms:.0f}ms {args.distribution}, "
+          f"שגיאות: {args.error_rate:.0%}, פגמים: {args.quirk_rate:.0%}")
+    print(f"הושלמו: {completed}, נכשלו: {outcome['failed']}, זמן: {elapsed:.1f}s")
+    print(f"תפוקה: {completed / elapsed:.1f} תיקים/שנייה, {messages / elapsed:.1f} הודעות/שנייה")
+
+    print(f"\n{'phase':<10}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for phase in PHASES:
+        values = latencies[phase]
+        print(f"{phase:<10}{len(values):>8}" + "".join(
+            f"{percentile(values, pct) * 1000:>8.1f}ms" for pct in (50, 95, 99)
+        ))
+
+    if args.cluster:
+        forwarded = {name: worker["forwarded"] for name, worker in front_stats["workers"].items()}
+        print(f"\nעדכונים לכל worker: {forwarded}, איזונים מחדש: {front_stats['rebalances']}")
+    else:
+        grown = len(SESSIONS) - sessions_before
+        rss_growth = rss_mb() - rss_before
+        print(f"\nSESSIONS: {len(SESSIONS)} (+{grown}), שיא RSS: +{rss_growth:.1f}MB"
+              + (f" (~{rss_growth * 1024 * 1024 / grown:.0f} B לסשן, כולל כל שאר ההקצאות)" if grown else ""))
+    print(f"קריאות DeepSeek: {counters.deepseek_calls} "
+          f"({counters.deepseek_calls / max(completed, 1):.2f} לתיק שהושלם), "
+          f"שגיאות מדומות: {counters.deepseek_errors}, פגמים: {counters.deepseek_quirks}")
+    print(f"קריאות Telegram: {counters.telegram_calls} {dict(sorted(counters.by_method.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+מיקרו-בנצ'מרק לפונקציות שרצות בכל הודעה, עם השוואה ל-baseline שמור
+
+1. זמן לקריאה לכל מקרה (timeit, חציון של כמה חזרות), מנורמל לפי לולאת
+   כיול שנמדדת צמוד לכל חזרה - כך שה-baseline שמיש גם במכונה אחרת, ושינוי
+   בתדר המעבד באמצע הריצה לא נראה כרגרסיה. מקרה שחרג נמדד שוב לפני כישלון
+2. קנה מידה: קלט עוין ארוך פי 16 צריך לעלות לכל היותר פי 32 (ריבועי
+   היה עולה פי 256) - בדיקה שלא תלויה במכונה
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.micro                 # השוואה ל-baseline, כישלון על רגרסיה
+    python -m benchmarks.micro --save          # עדכון ה-baseline
+    python -m benchmarks.micro --save --filter classifier   # עדכון המקרים האלה בלבד
+    python -m benchmarks.micro --threshold 1.5 --filter validators
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from app import slot_parser, validators
+from app.classifier import predict
+from app.followups import get_followups
+from app.json_extract import parse_analysis
+from app.knowledge_base import get_kb
+from app.rules import format_reply, get_recommendation
+from app.schemas import Analysis
+
+BASELINE = os.path.join(os.path.dirname(__file__), "data", "micro_baseline.json")
+
+# פי כמה מותר למקרה להיות איטי מה-baseline (אחרי נרמול). בין ריצות זהות
+# נמדדו עד x1.6 עם מדידה בודדת - הסף משאיר מרווח מעל הרעש
+DEFAULT_THRESHOLD = 2.0
+
+# משך מדידה אחת של מקרה; הרבה מדידות קצרות וחציון יציבים יותר מכמה ארוכות
+SAMPLE_SECONDS = 0.05
+
+# מתחת לזמן הזה לקריאה המדידה היא בעיקר תקורת הקריאה ל-lambda ורעש
+# (x1.4 בין ריצות זהות) - המקרה מוצג אבל לא נכשל על רגרסיה
+MIN_COMPARE_US = 1.0
+
+# פי כמה מותר לזמן לגדול כשהקלט גדל פי SCALE_FACTOR
+SCALE_FACTOR = 16
+MAX_SCALE_RATIO = SCALE_FACTOR * 2
+
+ANALYSIS = Analysis(
+    category="שכירות",
+    complexity="בינונית",
+    summary="השוכר מבקש את החזר הפיקדון בסך 10,000 ₪ ובעל הבית מסרב בטענה לנזקים בדירה.",
+    missing_info=["פרוטוקול מסירה", "תמונות מצב הדירה", "חוזה השכירות"],
+    confidence=0.82,
+)
+
+MODEL_REPLY = json.dumps(ANALYSIS.model_dump(), ensure_ascii=False)
+
+PROBLEM = (
+    "שכרתי דירה בתל אביב לפני שנתיים, בסוף החוזה בעל הבית מסרב להחזיר לי את "
+    "הפיקדון של 10,000 ש\"ח וטוען שיש נזקים בדירה, למרות שהשארתי אותה נקייה."
+)
+
+
+def _analysis(category: str) -> Analysis:
+    return ANALYSIS.model_copy(update={"category": category})
+
+
+# קלטים עוינים: פונקציה שמקבלת אורך ומחזירה טקסט
+ADVERSARIAL: Dict[str, Callable[[int], str]] = {
+    "no-digits": lambda n: "א" * n,
+    "sparse-digits": lambda n: ("סכום של " * (n // 8))[:n] + "1",
+    "spaces": lambda n: " " * n + "כן" + " " * n,
+    "unclosed-braces": lambda n: "{" * n,
+    "quotes": lambda n: '{"' * (n // 2),
+    "prose+json": lambda n: "א" * n + MODEL_REPLY,
+    "keyword-flood": lambda n: ("שכירות דירה " * (n // 12))[:n],
+}
+
+
+def cases() -> Dict[str, Callable[[], object]]:
+    """מקרי המדידה: שם -> קריאה ללא ארגומנטים"""
+    long_number = ADVERSARIAL["sparse-digits"](4000)
+    long_text = ADVERSARIAL["no-digits"](4000)
+    fenced = f"להלן הניתוח:\n```json\n{MODEL_REPLY}\n```"
+    repaired = MODEL_REPLY[:-1] + ",}"
+    result: Dict[str, Callable[[], object]] = {}
+
+    for module in (validators, slot_parser):
+        name = module.__name__.split(".")[-1]
+        validate = module.validate
+        result.update({
+            f"{name}.bool": lambda v=validate: v("bool", "כן"),
+            f"{name}.bool-miss": lambda v=validate: v("bool", "אולי בשבוע הבא"),
+            f"{name}.number": lambda v=validate: v("number", '20,000 ש"ח'),
+            f"{name}.text": lambda v=validate: v("text", "לפני חודשיים בערך"),
+            f"{name}.number-4k": lambda v=validate: v("number", long_number),
+            f"{name}.bool-4k": lambda v=validate: v("bool", long_text),
+        })
+
+    # ניתוח לכל קטגוריה במאגר הידע
+    per_category = [_analysis(category) for category in get_kb().followups]
+    result.update({
+        "followups.get_followups": lambda: [get_followups(a) for a in per_category],
+        "rules.format_reply": lambda: format_reply(ANALYSIS),
+        "rules.format_reply+resources": lambda: format_reply(ANALYSIS, include_resources=True),
+        "rules.get_recommendation": lambda: get_recommendation(ANALYSIS),
+        "json_extract.direct": lambda: parse_analysis(MODEL_REPLY),
+        "json_extract.fenced": lambda: parse_analysis(fenced),
+        "json_extract.repaired": lambda: parse_analysis(repaired),
+        "json_extract.unclosed-4k": lambda: _swallow(parse_analysis, "{" * 4000),
+        "classifier.predict": lambda: predict(PROBLEM),
+        "classifier.predict-4k": lambda: predict(ADVERSARIAL["keyword-flood"](4000)),
+    })
+    return result
+
+
+def _swallow(fn: Callable[[str], object], text: str):
+    try:
+        return fn(text)
+    except ValueError:
+        return None
+
+
+def _calibration():
+    """לולאת פייתון טהורה קבועה - קנה המידה של מהירות המכונה"""
+    total = 0
+    for i in range(1000):
+        total += i * i % 7
+    return total
+
+
+def _loops(timer: timeit.Timer, target: float) -> int:
+    """מספר הקריאות למדידה אחת שנמשכת לפחות target שניות"""
+    number = 1
+    while timer.timeit(number) < target:
+        number *= 2
+    return number
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """
+    (שניות לקריאה, יחידות כיול) - חציון על פני repeat חזרות
+
+    בכל חזרה לולאת הכיול נמדדת מיד לפני המקרה, והיחידות הן היחס בין
+    השניים באותה חזרה.
+    """
+    case = timeit.Timer(fn)
+    number = _loops(case, SAMPLE_SECONDS)
+    calibration = timeit.Timer(_calibration)
+    calibration_number = _loops(calibration, SAMPLE_SECONDS / 4)
+    seconds: List[float] = []
+    units: List[float] = []
+    for _ in range(repeat):
+        unit = calibration.timeit(calibration_number) / calibration_number
+        elapsed = case.timeit(number) / number
+        seconds.append(elapsed)
+        units.append(elapsed / unit)
+    return statistics.median(seconds), statistics.median(units)
+
+
+def scaling_cases() -> Dict[str, Tuple[Callable[[str], object], Callable[[int], str]]]:
+    """פונקציות עם ביטויים רגולריים מול קלטים עוינים"""
+    return {
+        "validators.number/sparse-digits": (lambda t: validators.validate("number", t), ADVERSARIAL["sparse-digits"]),
+        "validators.bool/spaces": (lambda t: validators.validate("bool", t), ADVERSARIAL["spaces"]),
+        "slot_parser.number/no-digits": (lambda t: slot_parser.validate("number", t), ADVERSARIAL["no-digits"]),
+        "json_extract/unclosed-braces": (lambda t: _swallow(parse_analysis, t), ADVERSARIAL["unclosed-braces"]),
+        "json_extract/quotes": (lambda t: _swallow(parse_analysis, t), ADVERSARIAL["quotes"]),
+        "json_extract/prose+json": (lambda t: _swallow(parse_analysis, t), ADVERSARIAL["prose+json"]),
+        "classifier/keyword-flood": (predict, ADVERSARIAL["keyword-flood"]),
+    }
+
+
+def check_scaling(repeat: int, size: int = 4000) -> List[str]:
+    failures = []
+    print(f"\n{'scaling':<36}{size:>10,}{size * SCALE_FACTOR:>12,}{'ratio':>8}")
+    for name, (fn, make) in scaling_cases().items():
+        small, large = make(size), make(size * SCALE_FACTOR)
+        for _ in range(2):
+            # כמו במקרים הרגילים: חריגה נמדדת שוב לפני כישלון
+            t_small = measure(lambda: fn(small), repeat)[0]
+            t_large = measure(lambda: fn(large), repeat)[0]
+            ratio = t_large / t_small
+            if ratio <= MAX_SCALE_RATIO:
+                break
+        flag = "" if ratio <= MAX_SCALE_RATIO else "  <-- לא ליניארי"
+        print(f"{name:<36}{t_small * 1e6:>8.1f}µs{t_large * 1e6:>10.1f}µs{ratio:>7.1f}x{flag}")
+        if flag:
+            failures.append(f"{name}: x{ratio:.1f} כשהקלט גדל פי {SCALE_FACTOR}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--save", action="store_true", help="שמירת התוצאות כ-baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="רק מקרים ששמם מכיל את המחרוזת")
+    args = parser.parse_args()
+
+    calibration = measure(_calibration, args.repeat)[0]
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # ביחידות של לולאת הכיול - משווה בין מכונות
+    results: Dict[str, float] = {}
+    failures: List[str] = []
+    print(f"{'case':<36}{'µs/call':>10}{'units':>10}{'baseline':>10}{'ratio':>8}")
+    all_cases = cases()
+    for name, fn in all_cases.items():
+        if args.filter not in name:
+            continue
+        seconds, units = measure(fn, args.repeat)
+        previous = baseline.get("cases", {}).get(name)
+        if previous and seconds * 1e6 >= MIN_COMPARE_US and units / previous > args.threshold:
+            # חריגה בודדת יכולה להיות רעש - נכשלים רק אם גם מדידה חוזרת חורגת
+            seconds, units = min(measure(fn, args.repeat), (seconds, units), key=lambda m: m[1])
+        results[name] = float(f"{units:.4g}")
+        line = f"{name:<36}{seconds * 1e6:>10.2f}{units:>10.3f}"
+        if previous:
+            ratio = units / previous
+            line += f"{previous:>10.3f}{ratio:>7.2f}x"
+            if seconds * 1e6 < MIN_COMPARE_US:
+                line += "  (מהיר מדי להשוואה)"
+            elif ratio > args.threshold:
+                line += "  <-- רגרסיה"
+                failures.append(f"{name}: x{ratio:.2f} מה-baseline")
+        print(line)
+
+    failures += check_scaling(args.repeat)
+
+    if args.save:
+        # עם --filter רק המקרים שנמדדו מתעדכנים; השאר נשמרים מה-baseline הקיים
+        # (היחידות מנורמלות, כך שאפשר לערבב מדידות מריצות שונות)
+        merged = {
+            name: results.get(name, baseline.get("cases", {}).get(name))
+            for name in all_cases
+            if name in results or name in baseline.get("cases", {})
+        }
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "calibration_us": round(calibration * 1e6, 3),
+                "cases": merged,
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nנשמר baseline: {BASELINE}")
+        return
+
+    if failures:
+        print("\nרגרסיות:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nאין רגרסיות" if baseline else "\nאין baseline - הריצו עם --save")
+
+
+if __name__ == "__main__":
+    main()
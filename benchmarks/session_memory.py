@@ -0,0 +1,81 @@
+"""
+מדידת זיכרון לסשן: בתים לסשן ב-10k / 100k / 1M סשנים
+
+הרצה מתיקיית הפרויקט:
+    python -m benchmarks.session_memory
+    python -m benchmarks.session_memory --sizes 10000 100000
+"""
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime
+from typing import Dict
+
+from app.session import Session
+
+# תשובות טיפוסיות באמצע שאלון שכירות
+SAMPLE_SLOTS = {
+    "has_contract": "כן",
+    "contract_duration": "שנה אחת",
+    "monthly_rent": "5200",
+}
+
+
+class LegacySession:
+    """הייצוג הקודם (__dict__, datetime, מפתחות מחרוזת) - להשוואה בלבד"""
+    def __init__(self):
+        self.active = True
+        self.awaiting_problem = False
+        self.analysis = None
+        self.slots: Dict[str, str] = {}
+        self.pending_slot = "deposit_amount"
+        self.pending_kind = "number"
+        self.pending_question = None
+        self.last_activity = datetime.now()
+
+
+def _fill(session_cls, count: int) -> Dict[int, object]:
+    sessions = {}
+    for user_id in range(count):
+        session = session_cls()
+        session.active = True
+        for name, value in SAMPLE_SLOTS.items():
+            # מחרוזת חדשה לכל משתמש, כמו תשובה שהגיעה מטלגרם
+            key = "".join(name)
+            if isinstance(session, Session):
+                session.set_slot(key, value)
+            else:
+                session.slots[key] = value
+        session.pending_slot = "deposit_amount"
+        session.pending_kind = "number"
+        sessions[user_id] = session
+    return sessions
+
+
+def measure(session_cls, count: int) -> float:
+    """בתים לסשן (כולל הרשומה במילון SESSIONS)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = _fill(session_cls, count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    gc.collect()
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'sessions':>10} {'legacy B/session':>18} {'compact B/session':>18} {'saving':>8}")
+    for count in args.sizes:
+        legacy = measure(LegacySession, count)
+        compact = measure(Session, count)
+        print(f"{count:>10} {legacy:>18.1f} {compact:>18.1f} {1 - compact / legacy:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()